@@ -13,17 +13,17 @@ SEE TUTORIAL FOR THE SETUP OF FABSIM3
 import chaospy as cp
 import numpy as np
 import easyvvuq as uq
-import matplotlib.pyplot as plt
 import os
+import sys
 import fabsim3_cmd_api as fab
-import tkinter as tk
-from tkinter import filedialog
+import ocean_reporting
 
 # author: Wouter Edeling
 __license__ = "LGPL"
 
-#Create EasyVVUQ Campaign and submit the jobs via FabSim3
-def run_sc_samples(work_dir):
+#Create EasyVVUQ Campaign and submit the jobs via FabSim3. If plot_file is specified, the
+#collocation points are plotted to this file
+def run_sc_samples(work_dir, plot_file=None):
     
     # Set up a fresh campaign called "sc"
     my_campaign = uq.Campaign(name='ocean', work_dir=work_dir)
@@ -79,12 +79,8 @@ def run_sc_samples(work_dir):
 
     my_campaign.populate_runs_dir()
     
-    fig = plt.figure()
-    ax = fig.add_subplot(111)
-    xi_d = my_sampler.xi_d
-    ax.plot(xi_d[:,0], xi_d[:, 1], 'ro')
-    plt.tight_layout()
-    plt.pause(0.1)
+    if plot_file is not None:
+        ocean_reporting.plot_collocation_points(my_sampler.xi_d, plot_file, labels=list(vary.keys()))
 
     #Run execution using Fabsim 
     # fab.run_uq_ensemble(my_campaign.campaign_dir, 'ocean', machine='eagle_vecma')
@@ -100,5 +96,8 @@ if __name__ == "__main__":
     
     work_dir = "/tmp"
 
+    #optionally, the file to which the collocation points are plotted
+    plot_file = sys.argv[1] if len(sys.argv) > 1 else None
+
     #perform the EasyVVUQ steps up to sampling
-    run_sc_samples(work_dir)
\ No newline at end of file
+    run_sc_samples(work_dir, plot_file)
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+===============================================================================
+PACKING OF MANY SHORT OCEAN RUNS INTO A FEW FABSIM3 JOBS
+-------------------------------------------------------------------------------
+A sample of the ocean model runs for only seconds, so when every run directory
+is a separate job, the scheduler and interpreter startup overhead dominate. This
+file groups K run directories of an EasyVVUQ campaign per job:
+    - get_group_size chooses K from the number of cores per job and an estimated
+      runtime per sample, such that a job runs for about target_job_time seconds,
+    - pack_runs copies the run directories into <campaign_dir>_packed/runs/Pack_<j>,
+      which is submitted with fab.run_uq_ensemble and a FabSim3 template that runs
+          python3 ensemble_packing.py <pack_dir> <n_workers>
+      in every pack directory (see run_uq_ensemble_packed),
+    - inside the job, run_pack integrates the samples in a local pool of worker
+      processes, one sample per task, and stores the timings in pack_timing.json,
+    - unpack_runs copies the outputs back to the run directories of the campaign,
+    - throughput_report compares the achieved throughput with one job per sample.
+===============================================================================
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+__license__ = "LGPL"
+
+HOME = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.insert(0, os.path.join(HOME, 'sc'))
+import ocean
+
+#input file of a run directory, and the timings of a pack
+INPUT_FILENAME = 'ocean_in.json'
+TIMING_FILENAME = 'pack_timing.json'
+
+def estimate_runtime(decay_time_nu=5.0, decay_time_mu=90.0, **opts):
+    """
+    Wall time of a single sample on this machine, in seconds.
+    """
+    tic = time.time()
+    ocean.run(decay_time_nu, decay_time_mu, verbose=False, **opts)
+    return time.time() - tic
+
+def get_group_size(n_runs, n_cores, runtime_per_sample, target_job_time=3600.0):
+    """
+    The number of run directories K per job: every core of the job integrates
+    samples for about target_job_time seconds, and K <= n_runs.
+    """
+    samples_per_core = max(1, int(np.floor(target_job_time/runtime_per_sample)))
+    return int(min(n_runs, n_cores*samples_per_core))
+
+def get_run_names(campaign_dir):
+    """
+    The names of the run directories of campaign_dir/runs.
+    """
+    runs_dir = os.path.join(campaign_dir, 'runs')
+    return sorted(name for name in os.listdir(runs_dir)
+                  if os.path.isfile(os.path.join(runs_dir, name, INPUT_FILENAME)))
+
+def pack_runs(campaign_dir, group_size):
+    """
+    Copies the run directories of campaign_dir/runs into groups of group_size in
+    <campaign_dir>_packed/runs/Pack_<j>/. Returns the packed directory.
+    """
+    runs_dir = os.path.join(campaign_dir, 'runs')
+    run_names = get_run_names(campaign_dir)
+
+    packed_dir = campaign_dir.rstrip('/') + '_packed'
+    if os.path.exists(packed_dir):
+        shutil.rmtree(packed_dir)
+
+    for j, start in enumerate(range(0, len(run_names), group_size)):
+        pack_dir = os.path.join(packed_dir, 'runs', 'Pack_{}'.format(j + 1))
+        for name in run_names[start:start + group_size]:
+            shutil.copytree(os.path.join(runs_dir, name), os.path.join(pack_dir, name))
+
+    return packed_dir
+
+def _run_sample(sample):
+    # Executed in a worker process. The samples are integrated one by one, since a batch
+    # does not improve the throughput and its memory use grows with the number of samples
+    tic = time.time()
+    ocean.run_batch([sample], verbose=False)
+    return time.time() - tic
+
+def _get_startup_time():
+    # Time to start an interpreter and import the ocean model, paid once per sample
+    # when every sample is a separate job
+    tic = time.time()
+    subprocess.run([sys.executable, '-c', 'import sys; sys.path.insert(0, "{}"); import ocean'.format(
+                    os.path.join(HOME, 'sc'))], check=True)
+    return time.time() - tic
+
+def run_pack(pack_dir, n_workers=None):
+    """
+    Integrates all run directories of pack_dir in a pool of n_workers processes
+    (by default the number of cores), and writes the timings to pack_timing.json.
+    """
+    tic = time.time()
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    samples = ocean.read_inputs([pack_dir], INPUT_FILENAME)
+    n_workers = max(1, min(n_workers, len(samples)))
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        compute_times = list(pool.map(_run_sample, samples))
+
+    wall_time = time.time() - tic
+
+    timing = {'n_samples': len(samples), 'n_workers': n_workers, 'wall_time': wall_time,
+              'compute_time': float(np.sum(compute_times)),
+              'startup_time': _get_startup_time()}
+
+    with open(os.path.join(pack_dir, TIMING_FILENAME), 'w') as f:
+        json.dump(timing, f)
+
+    return timing
+
+def unpack_runs(packed_dir, campaign_dir):
+    """
+    Copies the output files of the packed run directories back to campaign_dir/runs.
+    Returns the number of run directories that were unpacked.
+    """
+    n_unpacked = 0
+    packed_runs_dir = os.path.join(packed_dir, 'runs')
+
+    for pack in sorted(os.listdir(packed_runs_dir)):
+        pack_dir = os.path.join(packed_runs_dir, pack)
+        for name in os.listdir(pack_dir):
+            if not os.path.isdir(os.path.join(pack_dir, name)):
+                continue
+            run_dir = os.path.join(campaign_dir, 'runs', name)
+            for fname in os.listdir(os.path.join(pack_dir, name)):
+                if fname != INPUT_FILENAME:
+                    shutil.copy2(os.path.join(pack_dir, name, fname), os.path.join(run_dir, fname))
+            n_unpacked += 1
+
+    return n_unpacked
+
+def throughput_report(packed_dir, scheduler_overhead=60.0):
+    """
+    Prints the throughput of the packed jobs in samples per core-hour, versus the
+    estimate for one job per sample, where every sample pays the interpreter startup
+    time measured in the jobs plus scheduler_overhead seconds (queueing and launching
+    a job, machine dependent). Returns both throughputs.
+    """
+    packed_runs_dir = os.path.join(packed_dir, 'runs')
+    timings = []
+    for pack in sorted(os.listdir(packed_runs_dir)):
+        fname = os.path.join(packed_runs_dir, pack, TIMING_FILENAME)
+        if os.path.isfile(fname):
+            with open(fname, 'r') as f:
+                timings.append(json.load(f))
+
+    if len(timings) == 0:
+        print('No', TIMING_FILENAME, 'files found in', packed_runs_dir)
+        return None, None
+
+    n_samples = np.sum([timing['n_samples'] for timing in timings])
+    core_hours = np.sum([timing['wall_time']*timing['n_workers'] for timing in timings])/3600.0
+    runtime_per_sample = np.sum([timing['compute_time'] for timing in timings])/n_samples
+    startup_time = np.mean([timing['startup_time'] for timing in timings])
+
+    throughput_packed = n_samples/core_hours
+    throughput_single = 3600.0/(runtime_per_sample + startup_time + scheduler_overhead)
+
+    print('========================================================')
+    print('Packed jobs =', len(timings), ', samples =', n_samples)
+    print('Runtime per sample =', np.around(runtime_per_sample, 3), 's, startup =',
+          np.around(startup_time, 3), 's, scheduler overhead =', scheduler_overhead, 's')
+    print('Throughput packed =', np.around(throughput_packed, 1), 'samples per core-hour')
+    print('Throughput one job per sample =', np.around(throughput_single, 1), 'samples per core-hour')
+    print('Speedup =', np.around(throughput_packed/throughput_single, 2))
+    print('========================================================')
+
+    return throughput_packed, throughput_single
+
+def run_uq_ensemble_packed(campaign_dir, n_cores, runtime_per_sample=None, target_job_time=3600.0,
+                           script_name='ocean_packed', machine='localhost', blocking=True):
+    """
+    Packs the run directories of campaign_dir and submits the packs with FabSim3. The
+    FabSim3 template script_name must run 'python3 $ocean_packing_exec . <n_cores>'.
+    Afterwards, fetch the results with get_uq_samples_packed. Returns the FabSimJob
+    and the packed directory.
+    """
+    import fabsim3_cmd_api as fab
+
+    n_runs = len(get_run_names(campaign_dir))
+    if runtime_per_sample is None:
+        runtime_per_sample = estimate_runtime()
+
+    group_size = get_group_size(n_runs, n_cores, runtime_per_sample, target_job_time)
+    packed_dir = pack_runs(campaign_dir, group_size)
+    print('Packed', n_runs, 'runs into jobs of', group_size, 'runs in', packed_dir)
+
+    job = fab.run_uq_ensemble(packed_dir, script_name, machine=machine, blocking=blocking)
+
+    return job, packed_dir
+
+def get_uq_samples_packed(campaign_dir, machine='localhost'):
+    """
+    Retrieves the results of a packed ensemble, and copies them to the run
+    directories of campaign_dir.
+    """
+    import fabsim3_cmd_api as fab
+
+    packed_dir = campaign_dir.rstrip('/') + '_packed'
+    fab.get_uq_samples(packed_dir, machine=machine)
+    return unpack_runs(packed_dir, campaign_dir)
+
+if __name__ == "__main__":
+
+    #executed inside a packed job: python3 ensemble_packing.py <pack_dir> [n_workers]
+    pack_dir = sys.argv[1] if len(sys.argv) > 1 else '.'
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    timing = run_pack(pack_dir, n_workers)
+    print('Integrated', timing['n_samples'], 'samples with', timing['n_workers'], 'workers in',
+          np.around(timing['wall_time'], 2), 's')
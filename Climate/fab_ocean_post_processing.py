@@ -5,14 +5,16 @@ fab_ocean_job_submission.py
 ===============================================================================
 """
 
-import chaospy as cp
 import numpy as np
 import easyvvuq as uq
-import matplotlib.pyplot as plt
 import os
+import sys
+import time
 import fabsim3_cmd_api as fab
-import pandas as pd
-from scipy import stats
+from sc_surrogate import get_sc_surrogate
+from sc_analysis_cache import get_sc_analysis
+from binned_kde import BinnedKDE
+import ocean_reporting
 
 # author: Wouter Edeling
 __license__ = "LGPL"
@@ -20,16 +22,74 @@ __license__ = "LGPL"
 #home directory of user
 home = os.path.expanduser('~')
 
+#kernel density estimate of the samples X, with the bandwidth of scipy.stats.gaussian_kde,
+#but computed via binning and an FFT, see binned_kde.py
 def get_kde(X, Npoints = 100):
 
-    kernel = stats.gaussian_kde(X)
+    kernel = BinnedKDE(X)
     x = np.linspace(np.min(X), np.max(X), Npoints)
     pde = kernel.evaluate(x)
     return x, pde
         
-#post processing of UQ samples executed via FabSim. All samples must have been completed
-#before this subroutine is executed. Use 'fabsim <machine_name> job_stat' to check their status
-def post_proc(state_file, work_dir):
+#repeatedly fetch the results of the (remote) host via FabSim3 and collate the run directories
+#that were completed since the previous fetch, until all runs of the campaign are collated.
+#FabSim3 copies the results with rsync, so every fetch only transfers newly completed runs,
+#and EasyVVUQ only decodes runs that were not collated before. If provisional_stats is True,
+#the mean and standard deviation over the samples collated so far are printed after each fetch.
+#Once no jobs of the ensemble are queued or running anymore (fab.poll_status), the results are
+#fetched a last time, and the runs that are still missing are reported. Returns the list of
+#missing run ids, which is empty if all runs were collated.
+def collate_incrementally(my_campaign, output_columns, machine='localhost', poll_interval=30.0,
+                          timeout=None, provisional_stats=True):
+
+    run_ids = [run_id for run_id, _ in my_campaign.list_runs()]
+    start = time.time()
+    n_collated_prev = -1
+    finished = False
+
+    while True:
+
+        fab.get_uq_samples(my_campaign.campaign_dir, machine=machine)
+        my_campaign.collate()
+
+        data = my_campaign.get_collation_result()
+        collated = set(data['run_id']) if len(data) > 0 else set()
+        n_collated = len(collated)
+        print('Collated', n_collated, 'of', len(run_ids), 'runs')
+
+        if provisional_stats and n_collated > 0:
+            for qoi in output_columns:
+                print('    provisional', qoi, ': mean =', data[qoi].mean(), ', std =', data[qoi].std())
+
+        missing = [run_id for run_id in run_ids if run_id not in collated]
+        if len(missing) == 0:
+            return missing
+        if finished:
+            print('The jobs of the ensemble have finished, but', len(missing), 'runs are missing:')
+            print('    ', ', '.join(str(run_id) for run_id in missing))
+            return missing
+        if timeout is not None and time.time() - start + poll_interval > timeout:
+            print('Timeout,', len(missing), 'runs have not been collated:')
+            print('    ', ', '.join(str(run_id) for run_id in missing))
+            return missing
+
+        #stop after one more fetch once no jobs of the ensemble are queued or running. If the
+        #job status is not available, stop once a fetch brings in no new runs.
+        try:
+            n_active, _ = fab.poll_status(my_campaign.campaign_dir, machine=machine)
+            finished = n_active == 0
+        except RuntimeError as e:
+            print(e)
+            finished = n_collated == n_collated_prev
+        n_collated_prev = n_collated
+
+        if not finished:
+            time.sleep(poll_interval)
+
+#post processing of UQ samples executed via FabSim. The results are fetched and collated as they
+#come in, the SC analysis is performed once all samples have been collated. Raises a RuntimeError
+#if runs are missing after the jobs have finished, or after timeout seconds.
+def post_proc(state_file, work_dir, machine='localhost', poll_interval=30.0, timeout=None):
     
     #Reload the campaign
     my_campaign = uq.Campaign(state_file = state_file, work_dir = work_dir)
@@ -42,16 +102,15 @@ def post_proc(state_file, work_dir):
     my_sampler = my_campaign.get_active_sampler()
     output_columns = my_campaign._active_app_decoder.output_columns
     
-    #fetch the results from the (remote) host via FabSim3
-    fab.get_uq_samples(my_campaign.campaign_dir, machine='localhost')
-
-    #collate output
-    my_campaign.collate()
+    #fetch and collate the results from the (remote) host via FabSim3, as they come in
+    missing = collate_incrementally(my_campaign, output_columns, machine=machine,
+                                    poll_interval=poll_interval, timeout=timeout)
+    if len(missing) > 0:
+        raise RuntimeError('{} runs have not been collated, the SC analysis requires all runs'.format(len(missing)))
 
-    # Post-processing analysis
-    sc_analysis = uq.analysis.SCAnalysis(sampler=my_sampler, qoi_cols=output_columns)
-    my_campaign.apply_analysis(sc_analysis)
-    results = my_campaign.get_last_analysis()
+    # Post-processing analysis, loaded from the cache in the campaign dir if no new runs
+    # were collated since the last time, see sc_analysis_cache.py
+    results, sc_analysis = get_sc_analysis(my_campaign, my_sampler, output_columns)
     
     return results, sc_analysis, my_sampler, my_campaign
 
@@ -62,6 +121,9 @@ if __name__ == "__main__":
 
     work_dir = "/tmp"
 
+    #optionally, the file to which the KDE of the surrogate is plotted
+    plot_file = sys.argv[1] if len(sys.argv) > 1 else None
+
     results, sc_analysis, my_sampler, my_campaign = post_proc(state_file="campaign_state.json", work_dir = work_dir)
     mu_E = results['statistical_moments']['E_mean']['mean']
     std_E = results['statistical_moments']['E_mean']['std']
@@ -87,44 +149,29 @@ if __name__ == "__main__":
     #################################
     
     #number of MC samples
-    n_mc = 50000
-    
-    fig = plt.figure()
-    ax = fig.add_subplot(111, xlabel=r'$E$', yticks = [])
+    n_mc = 10**6
     
     #get the input distributions
     theta = my_sampler.vary.get_values()
-    xi = np.zeros([n_mc, 2])
-    idx = 0
     
-    #draw random sampler from the input distributions
+    #draw random sampler from the input distributions, shape (n_mc, 2)
     print('Sampling surrogate', n_mc, 'times...')
-    for theta_i in theta:
-        xi[:, idx] = theta_i.sample(n_mc)
-        idx += 1
+    xi = np.array([theta_i.sample(n_mc) for theta_i in theta]).T
     print('done')
         
-    #evaluate the surrogate at the random values
+    #evaluate the surrogate at all random values at once, in chunks of 10^5 samples
     Q = 'E_mean'
-    qoi = np.zeros(n_mc)
-    for i in range(n_mc):
-        qoi[i] = sc_analysis.surrogate(Q, xi[i])
+    surrogate = get_sc_surrogate(sc_analysis, my_sampler, qoi_cols=[Q])
+    qoi = surrogate(xi, Q)
         
-    #plot histogram of surrogate samples
+    #KDE of the surrogate samples
     x, kde = get_kde(qoi)
-    plt.plot(x, kde, label=r'$\mathrm{surrogate\;KDE}$')
 
     #make a list of actual samples
     samples = []
     for i in range(sc_analysis._number_of_samples):
         samples.append(sc_analysis.samples[Q][i])
     
-    plt.plot(samples, np.zeros(sc_analysis._number_of_samples), 'ro', label=r'$\mathrm{code\;samples}$')
-    
-    leg = plt.legend(loc=0)
-    plt.ticklabel_format(style='sci', axis='x', scilimits=(0,0))
-    leg.set_draggable(True)
-    
-    plt.tight_layout()
-    
-plt.show()
+    #plot the KDE and the code samples, only when requested
+    if plot_file is not None:
+        ocean_reporting.plot_surrogate_pdf(x, kde, samples, xlabel=r'$E$', fname=plot_file)
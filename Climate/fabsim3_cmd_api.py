@@ -1,33 +1,150 @@
 # FabSim3 Commands Python API
 #
 # This file maps command-line instructions for FabSim3 to Python functions.
-# NOTE: No effort is made to map output back to FabSim, as this complicates
-# the implementation greatly.
+# Every command is launched as a subprocess and returns a FabSimJob handle, which
+# captures the stdout, stderr and return code of the command. By default the
+# functions block until the command has finished, as before; with blocking=False
+# they return immediately, such that e.g. submission, fetching and collation can
+# be pipelined. poll_status and wait_for_ensemble query the job status of an
+# ensemble via 'fabsim <machine> job_stat'.
 #
-# This file can be included in any code base. 
+# This file can be included in any code base.
 # It has no dependencies, but does require a working FabSim3 installation.
+# The fabsim executable can be replaced via the FABSIM environment variable, e.g.
+# FABSIM="python3 fabsim_stub.py" to test this API without FabSim3, see fabsim_stub.py.
 
 import os
+import shlex
+import subprocess
+import threading
+import time
 
-def fabsim(command, arguments, machine = 'localhost'):
+#the fabsim executable
+FABSIM = os.environ.get('FABSIM', 'fabsim')
+
+class FabSimJob:
     """
-    Generic function for running any FabSim3 command.
+    Handle of a fabsim command running in a subprocess. The output is read by a
+    background thread, so the command never blocks on a full pipe.
     """
-    print('Executing', "fabsim {} {}:{}".format(machine, command, arguments))
-    os.system("fabsim {} {}:{}".format(machine, command, arguments))
+    def __init__(self, command, arguments, machine='localhost'):
+
+        self.command = command
+        self.arguments = arguments
+        self.machine = machine
+        task = "{}:{}".format(command, arguments) if arguments else command
+        self.args = shlex.split(FABSIM) + [machine, task]
+
+        self.stdout = None
+        self.stderr = None
+
+        self.process = subprocess.Popen(self.args, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, universal_newlines=True)
+        self._reader = threading.Thread(target=self._communicate, daemon=True)
+        self._reader.start()
+
+    def _communicate(self):
+        self.stdout, self.stderr = self.process.communicate()
+
+    def poll(self):
+        """
+        The return code of the command, or None if it is still running.
+        """
+        if self._reader.is_alive():
+            return None
+        return self.process.returncode
+
+    def done(self):
+        return self.poll() is not None
+
+    def wait(self, timeout=None):
+        """
+        Waits until the command has finished and returns its return code, or None
+        after timeout seconds.
+        """
+        self._reader.join(timeout)
+        return self.poll()
 
-def run_uq_ensemble(campaign_dir, script_name, machine='localhost'):
+    @property
+    def returncode(self):
+        return self.process.returncode
+
+    def succeeded(self):
+        return self.poll() == 0
+
+    def __repr__(self):
+        return "FabSimJob('{}', returncode={})".format(' '.join(self.args), self.poll())
+
+def fabsim(command, arguments, machine = 'localhost', blocking=True, verbose=True):
+    """
+    Generic function for running any FabSim3 command. Returns a FabSimJob. If
+    blocking, waits for the command to finish and prints its output.
+    """
+    if verbose:
+        print('Executing', "fabsim {} {}:{}".format(machine, command, arguments))
+
+    job = FabSimJob(command, arguments, machine=machine)
+
+    if blocking:
+        job.wait()
+        if verbose:
+            print(job.stdout, end='')
+            if job.returncode != 0:
+                print(job.stderr, end='')
+                print('fabsim', command, 'failed with return code', job.returncode)
+
+    return job
+
+def run_uq_ensemble(campaign_dir, script_name, machine='localhost', blocking=True):
     """
     Launches a UQ ensemble.
     """
     sim_ID = campaign_dir.split('/')[-1]
     arguments = "{},campaign_dir={},script_name={}".format(sim_ID, campaign_dir, script_name)
-    fabsim("run_uq_ensemble", arguments, machine=machine)
-    
-def get_uq_samples(campaign_dir, machine = 'localhost'):
+    return fabsim("run_uq_ensemble", arguments, machine=machine, blocking=blocking)
+
+def get_uq_samples(campaign_dir, machine = 'localhost', blocking=True):
     """
     Retrieves results from UQ ensemble
     """
     sim_ID = campaign_dir.split('/')[-1]
     arguments = "{},campaign_dir={}".format(sim_ID, campaign_dir)
-    fabsim("get_uq_samples", arguments, machine=machine)
\ No newline at end of file
+    return fabsim("get_uq_samples", arguments, machine=machine, blocking=blocking)
+
+def poll_status(campaign_dir, machine='localhost'):
+    """
+    Returns the number of jobs of the ensemble that are still queued or running,
+    and the output of 'fabsim <machine> job_stat'. The jobs are identified by the
+    ensemble name (the last part of campaign_dir), which FabSim3 uses as the config
+    name in the job names.
+    """
+    sim_ID = campaign_dir.split('/')[-1]
+
+    job = FabSimJob("job_stat", "", machine=machine)
+    job.wait()
+    if job.returncode != 0:
+        raise RuntimeError("fabsim {} job_stat failed with return code {}:\n{}".format(
+                           machine, job.returncode, job.stderr))
+
+    n_active = len([line for line in job.stdout.splitlines() if sim_ID in line])
+
+    return n_active, job.stdout
+
+def wait_for_ensemble(campaign_dir, machine='localhost', poll_interval=30.0, timeout=None,
+                      verbose=True):
+    """
+    Polls the job status every poll_interval seconds until no jobs of the ensemble
+    are queued or running. Returns True if the ensemble has finished, or False
+    after timeout seconds.
+    """
+    start = time.time()
+
+    while True:
+        n_active, _ = poll_status(campaign_dir, machine=machine)
+        if n_active == 0:
+            return True
+        if verbose:
+            print(n_active, 'jobs of', campaign_dir.split('/')[-1], 'still active on', machine)
+        if timeout is not None and time.time() - start + poll_interval > timeout:
+            return False
+        time.sleep(poll_interval)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+===============================================================================
+STUB OF THE FABSIM EXECUTABLE, TO TEST fabsim3_cmd_api.py WITHOUT FABSIM3
+-------------------------------------------------------------------------------
+Usage: FABSIM="python3 fabsim_stub.py" python3 <script using fabsim3_cmd_api>
+
+Emulates 'fabsim <machine> <command>:<arguments>' for the commands used by
+fabsim3_cmd_api.py:
+    - run_uq_ensemble:<sim_ID>,campaign_dir=...,script_name=... registers one job
+      per run directory of campaign_dir/runs (or a single job),
+    - job_stat lists the registered jobs that are still active. The jobs finish
+      one by one, one every FABSIM_STUB_JOB_TIME seconds (default 1),
+    - get_uq_samples:<sim_ID>,campaign_dir=... only prints what it would fetch.
+The state is stored in FABSIM_STUB_DIR (default <tmp>/fabsim_stub). A command
+named in FABSIM_STUB_FAIL fails with return code 3, to test error handling.
+Other commands fail with return code 1.
+===============================================================================
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+__license__ = "LGPL"
+
+STATE_DIR = os.environ.get('FABSIM_STUB_DIR', os.path.join(tempfile.gettempdir(), 'fabsim_stub'))
+JOB_TIME = float(os.environ.get('FABSIM_STUB_JOB_TIME', 1.0))
+
+def parse_task(task):
+    """
+    Splits '<command>:<arg>,<key>=<value>,...' into the command, the positional
+    arguments and the keyword arguments.
+    """
+    command, _, arguments = task.partition(':')
+    args = []
+    kwargs = {}
+    for argument in filter(None, arguments.split(',')):
+        if '=' in argument:
+            key, value = argument.split('=', 1)
+            kwargs[key] = value
+        else:
+            args.append(argument)
+    return command, args, kwargs
+
+def load_jobs():
+    fname = os.path.join(STATE_DIR, 'jobs.json')
+    if not os.path.isfile(fname):
+        return {}
+    with open(fname, 'r') as f:
+        return json.load(f)
+
+def save_jobs(jobs):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(os.path.join(STATE_DIR, 'jobs.json'), 'w') as f:
+        json.dump(jobs, f)
+
+def main(argv):
+
+    if len(argv) != 2:
+        sys.stderr.write('usage: fabsim_stub.py <machine> <command>:<arguments>\n')
+        return 1
+
+    machine, task = argv
+    command, args, kwargs = parse_task(task)
+
+    if command == os.environ.get('FABSIM_STUB_FAIL'):
+        sys.stderr.write('fabsim_stub: {} failed on purpose\n'.format(command))
+        return 3
+
+    if command == 'run_uq_ensemble':
+        sim_ID = args[0]
+        runs_dir = os.path.join(kwargs.get('campaign_dir', ''), 'runs')
+        n_jobs = len(os.listdir(runs_dir)) if os.path.isdir(runs_dir) else 1
+        jobs = load_jobs()
+        jobs[sim_ID] = {'machine': machine, 'n_jobs': n_jobs, 'start': time.time()}
+        save_jobs(jobs)
+        print('Submitted', n_jobs, 'jobs of', sim_ID, 'with', kwargs.get('script_name'), 'to', machine)
+        return 0
+
+    if command == 'job_stat':
+        print('jobID     jobName     jobStatus')
+        for sim_ID, job in load_jobs().items():
+            if job['machine'] != machine:
+                continue
+            n_finished = int((time.time() - job['start'])/JOB_TIME)
+            for i in range(n_finished, job['n_jobs']):
+                print('{}     {}_{}_{}     RUNNING'.format(1000 + i, sim_ID, machine, i + 1))
+        return 0
+
+    if command == 'get_uq_samples':
+        print('Fetching results of', args[0], 'from', machine, 'to', kwargs.get('campaign_dir'))
+        return 0
+
+    sys.stderr.write('fabsim_stub: unknown command {}\n'.format(command))
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
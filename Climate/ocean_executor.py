@@ -0,0 +1,186 @@
+# Local, in-process execution of an EasyVVUQ ensemble of the 2D ocean model
+#
+# Instead of rendering ocean.template, launching a Python interpreter per run and
+# parsing output.csv afterwards, LocalOceanExecutor calls ocean.run_batch directly
+# with the parameters stored in the campaign, in a pool of worker processes. By
+# default every worker integrates one run at a time. The QoIs are returned to the
+# calling process and kept in memory, where OceanDecoder picks them up during
+# collation. The output csv file of every run is still written by default, such
+# that the run directories can also be decoded with SimpleCSV afterwards.
+#
+# Usage, after my_campaign.populate_runs_dir():
+#
+#   executor = LocalOceanExecutor(max_workers=4)
+#   executor.run_campaign(my_campaign)
+#   my_campaign.collate()
+#
+# with decoder = OceanDecoder(target_filename='output.csv', output_columns=[...]).
+
+import os
+import sys
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from easyvvuq import OutputType
+from easyvvuq.decoders.base import BaseDecoder
+
+__license__ = "LGPL"
+
+HOME = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.insert(0, os.path.join(HOME, 'sc'))
+import ocean
+
+# The QoIs of the runs executed by a LocalOceanExecutor in this process, keyed by
+# the absolute path of the run directory
+_results = {}
+
+def _run_batch(samples, opts):
+    # Executed in a worker process
+    return ocean.run_batch(samples, **opts)
+
+class LocalOceanExecutor:
+    """
+    Executes the runs of an EasyVVUQ campaign of the ocean model in a local
+    process pool, without template encoding, file decoding and interpreter startup.
+
+    Parameters
+    ----------
+    max_workers : number of worker processes, by default the number of cores
+    batch_size : number of runs integrated simultaneously by a worker. Batching does
+                 not improve the throughput and its memory use grows with the batch,
+                 hence by default every run is integrated separately
+    write_output : write the output csv file to every run directory
+    opts : options of ocean.run_batch, e.g. fft_backend, fft_workers or dtype. Time series
+           and checkpoint files are written to the run directories (the checkpoint of a
+           batch to the directory of its first run), hence checkpoint_file cannot be given.
+    """
+    def __init__(self, max_workers=None, batch_size=1, write_output=True, **opts):
+
+        if 'checkpoint_file' in opts:
+            msg = "LocalOceanExecutor writes a checkpoint per batch, checkpoint_file cannot be specified."
+            logging.error(msg)
+            raise ValueError(msg)
+
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+        self.batch_size = batch_size
+        self.write_output = write_output
+        self.opts = {'verbose': False}
+        self.opts.update(opts)
+
+    def _get_sample(self, run_info):
+
+        params = run_info['params']
+        sample = {'decay_time_nu': float(params['decay_time_nu']),
+                  'decay_time_mu': float(params['decay_time_mu']),
+                  'outfile': None,
+                  'run_dir': run_info['run_dir']}
+
+        if self.write_output:
+            sample['outfile'] = os.path.join(run_info['run_dir'],
+                                             params.get('out_file', 'output.csv'))
+        return sample
+
+    def run(self, runs):
+        """
+        Executes the runs, a dict {run_id: run_info} or a list of (run_id, run_info)
+        tuples, where run_info contains the 'params' and 'run_dir' of the run.
+        Returns a dict {run_id: QoIs}.
+        """
+        runs = list(dict(runs).items())
+        if len(runs) == 0:
+            return {}
+
+        batch_size = self.batch_size
+        batches = [runs[i:i + batch_size] for i in range(0, len(runs), batch_size)]
+
+        results = {}
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(_run_batch, [self._get_sample(run_info) for _, run_info in batch],
+                                   self.opts) for batch in batches]
+
+            for batch, future in zip(batches, futures):
+                for (run_id, run_info), qois in zip(batch, future.result()):
+                    results[run_id] = qois
+                    _results[os.path.abspath(run_info['run_dir'])] = qois
+
+        return results
+
+    def run_campaign(self, campaign):
+        """
+        Executes all runs of an EasyVVUQ campaign, after populate_runs_dir.
+        """
+        return self.run(campaign.list_runs())
+
+    def act_on_dir(self, target_dir):
+        """
+        Executes a single run directory containing ocean_in.json in this process,
+        such that the executor can be used with campaign.apply_for_each_run_dir.
+        """
+        with open(os.path.join(target_dir, 'ocean_in.json'), 'r') as f:
+            params = json.load(f)
+        params['out_file'] = params.pop('outfile', 'output.csv')
+
+        run_info = {'params': params, 'run_dir': target_dir}
+        qois = ocean.run_batch([self._get_sample(run_info)], **self.opts)[0]
+        _results[os.path.abspath(target_dir)] = qois
+
+class OceanDecoder(BaseDecoder, decoder_name="ocean_decoder"):
+    """
+    Decodes the QoIs of a run from the results of a LocalOceanExecutor in this
+    process, or otherwise from the output csv file written by ocean.py.
+    """
+    def __init__(self, target_filename, output_columns):
+
+        if target_filename is None:
+            msg = (f"target_filename must be set for OceanDecoder. This should be"
+                   f"the name of the output file this decoder acts on.")
+            logging.error(msg)
+            raise Exception(msg)
+
+        if output_columns is None or len(output_columns) == 0:
+            msg = (f"output_columns must be specified for OceanDecoder.")
+            logging.error(msg)
+            raise Exception(msg)
+
+        self.target_filename = target_filename
+        self.output_columns = output_columns
+
+        self.output_type = OutputType('sample')
+
+    @staticmethod
+    def _get_output_path(run_info=None, outfile=None):
+
+        run_path = run_info['run_dir']
+
+        if not os.path.isdir(run_path):
+            raise RuntimeError(f"Run directory does not exist: {run_path}")
+
+        return os.path.join(run_path, outfile)
+
+    def sim_complete(self, run_info=None):
+
+        if os.path.abspath(run_info['run_dir']) in _results:
+            return True
+
+        return os.path.isfile(self._get_output_path(run_info, self.target_filename))
+
+    def parse_sim_output(self, run_info={}):
+
+        qois = _results.get(os.path.abspath(run_info['run_dir']))
+
+        if qois is None:
+            out_path = self._get_output_path(run_info, self.target_filename)
+            data = pd.read_csv(out_path, skipinitialspace=True)
+            return data[self.output_columns]
+
+        return pd.DataFrame({qoi: [qois[qoi]] for qoi in self.output_columns})
+
+    def get_restart_dict(self):
+        return {"target_filename": self.target_filename,
+                "output_columns": self.output_columns}
+
+    def element_version(self):
+        return "0.1"
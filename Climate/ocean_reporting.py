@@ -0,0 +1,120 @@
+"""
+===============================================================================
+OPTIONAL PLOTTING LAYER OF THE OCEAN CAMPAIGN SCRIPTS
+-------------------------------------------------------------------------------
+matplotlib is only imported when a figure is actually made, so the submission
+and post-processing scripts start quickly and also run on compute and login
+nodes without a display. When a file name is given, the figure is written with
+the non-interactive Agg backend; otherwise it is shown on screen if a display is
+available.
+
+Run this file to measure the import times of the heavy dependencies of the
+scripts, each in a fresh interpreter.
+===============================================================================
+"""
+
+import os
+import subprocess
+import sys
+
+__license__ = "LGPL"
+
+def has_display():
+    """
+    True if figures can be shown on screen.
+    """
+    if sys.platform.startswith('win') or sys.platform == 'darwin':
+        return True
+    return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+def get_pyplot(fname=None):
+    """
+    Imports matplotlib.pyplot, with the Agg backend if the figure is written to
+    file or no display is available.
+    """
+    import matplotlib
+    if fname is not None or not has_display():
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def _finish(plt, fig, fname):
+    plt.tight_layout()
+    if fname is not None:
+        fig.savefig(fname)
+        plt.close(fig)
+        print('Figure written to', fname)
+    elif has_display():
+        plt.show()
+    else:
+        plt.close(fig)
+        print('No display available, specify a file name to store the figure')
+
+def plot_collocation_points(xi_d, fname=None, labels=None):
+    """
+    Scatter plot of the first two inputs of the collocation points xi_d.
+    """
+    plt = get_pyplot(fname)
+
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    ax.plot(xi_d[:, 0], xi_d[:, 1], 'ro')
+    if labels is not None:
+        ax.set_xlabel(labels[0])
+        ax.set_ylabel(labels[1])
+
+    _finish(plt, fig, fname)
+
+def plot_surrogate_pdf(x, pdf, code_samples, xlabel=r'$E$', fname=None):
+    """
+    The KDE of the surrogate samples, together with the code samples.
+    """
+    plt = get_pyplot(fname)
+
+    fig = plt.figure()
+    ax = fig.add_subplot(111, xlabel=xlabel, yticks = [])
+    ax.plot(x, pdf, label=r'$\mathrm{surrogate\;KDE}$')
+    ax.plot(code_samples, [0.0]*len(code_samples), 'ro', label=r'$\mathrm{code\;samples}$')
+
+    leg = ax.legend(loc=0)
+    ax.ticklabel_format(style='sci', axis='x', scilimits=(0,0))
+    leg.set_draggable(True)
+
+    _finish(plt, fig, fname)
+
+def measure_import_time(module):
+    """
+    The wall time of importing module in a fresh interpreter, minus the startup time
+    of the interpreter itself, in seconds. None if the module is not installed.
+    """
+    code = 'import time; tic = time.time(); import {}; print(time.time() - tic)'.format(module)
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, universal_newlines=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout)
+
+if __name__ == "__main__":
+
+    #imported by the scripts at startup (before), and now only when a figure is made
+    lazy = ['matplotlib.pyplot']
+    #no longer imported, they were unused
+    removed = ['tkinter.filedialog', 'pandas']
+    #still imported at startup
+    eager = ['numpy', 'chaospy', 'easyvvuq', 'h5py']
+
+    print('========================================================')
+    print('%-20s %12s %10s' % ('module', 'import [s]', 'status'))
+    saved = 0.0
+    for modules, status in [(lazy, 'lazy'), (removed, 'removed'), (eager, 'eager')]:
+        for module in modules:
+            wall_time = measure_import_time(module)
+            if wall_time is None:
+                print('%-20s %12s %10s' % (module, 'n/a', status))
+                continue
+            print('%-20s %12.3f %10s' % (module, wall_time, status))
+            if status != 'eager':
+                saved += wall_time
+    print('========================================================')
+    print('Startup time saved, at most', round(saved, 3), 's')
+    print('========================================================')
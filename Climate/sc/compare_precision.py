@@ -0,0 +1,78 @@
+"""
+===============================================================================
+REGRESSION HARNESS FOR THE SINGLE-PRECISION MODE OF THE 2D OCEAN MODEL
+-------------------------------------------------------------------------------
+Runs ocean.py for a set of (decay_time_nu, decay_time_mu) samples, once in double
+(float64) and once in single (float32) precision, and reports the absolute and
+relative differences of the QoIs written to output.csv, plus the wall times.
+
+Usage: python compare_precision.py [<extra json options, e.g. '{"fft_backend": "scipy"}'>]
+===============================================================================
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+__license__ = "LGPL"
+
+HOME = os.path.abspath(os.path.dirname(__file__))
+
+#(decay_time_nu, decay_time_mu) of the samples, around the campaign defaults
+SAMPLES = [(5.0, 90.0), (4.0, 80.0), (6.0, 85.0), (5.0, 95.0)]
+
+QOI_COLS = ['E_mean', 'Z_mean', 'E_std', 'Z_std']
+
+#run all samples in a single (batched) ocean.py process with the given precision
+def run_ocean(work_dir, dtype, options={}):
+
+    run_dir = os.path.join(work_dir, dtype)
+    os.makedirs(run_dir)
+
+    inputs = []
+    for i, (decay_time_nu, decay_time_mu) in enumerate(SAMPLES):
+        sample = {'outfile': os.path.join(run_dir, 'output_{}.csv'.format(i)),
+                  'decay_time_nu': decay_time_nu, 'decay_time_mu': decay_time_mu,
+                  'dtype': dtype}
+        sample.update(options)
+        inputs.append(sample)
+
+    json_input = os.path.join(run_dir, 'ocean_in.json')
+    with open(json_input, 'w') as f:
+        json.dump(inputs, f)
+
+    tic = time.time()
+    subprocess.run([sys.executable, os.path.join(HOME, 'ocean.py'), json_input],
+                   check=True, stdout=subprocess.DEVNULL)
+    wall_time = time.time() - tic
+
+    qois = np.array([np.loadtxt(sample['outfile'], delimiter=',', skiprows=1) for sample in inputs])
+
+    return qois, wall_time
+
+if __name__ == "__main__":
+
+    options = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        qois_64, wall_time_64 = run_ocean(work_dir, 'float64', options)
+        qois_32, wall_time_32 = run_ocean(work_dir, 'float32', options)
+
+    abs_err = np.abs(qois_32 - qois_64)
+    rel_err = abs_err/np.abs(qois_64)
+
+    print('========================================================')
+    print('float32 versus float64 for', len(SAMPLES), 'samples')
+    print('========================================================')
+    print('%-8s %14s %14s %14s' % ('QoI', 'max |error|', 'max rel. error', 'mean rel. error'))
+    for i, qoi in enumerate(QOI_COLS):
+        print('%-8s %14.4e %14.4e %14.4e' % (qoi, np.max(abs_err[:, i]), np.max(rel_err[:, i]),
+                                             np.mean(rel_err[:, i])))
+    print('========================================================')
+    print('Wall time float64 =', np.around(wall_time_64, 2), 's')
+    print('Wall time float32 =', np.around(wall_time_32, 2), 's')
+    print('========================================================')
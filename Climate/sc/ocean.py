@@ -1,334 +1,452 @@
 #!/home/wouter/anaconda3/bin/python
 
 """
-*************************
-* S U B R O U T I N E S *
-*************************
-"""
-
-#pseudo-spectral technique to solve for Fourier coefs of Jacobian
-def compute_VgradW_hat(w_hat_n, P):
-    
-    #compute streamfunction
-    psi_hat_n = w_hat_n/k_squared_no_zero
-    psi_hat_n[0,0] = 0.0
-    
-    #compute jacobian in physical space
-    u_n = np.fft.irfft2(-ky*psi_hat_n)
-    w_x_n = np.fft.irfft2(kx*w_hat_n)
-
-    v_n = np.fft.irfft2(kx*psi_hat_n)
-    w_y_n = np.fft.irfft2(ky*w_hat_n)
-    
-    VgradW_n = u_n*w_x_n + v_n*w_y_n
-    
-    #return to spectral space
-    VgradW_hat_n = np.fft.rfft2(VgradW_n)
-    
-    VgradW_hat_n *= P
-    
-    return VgradW_hat_n
-
-#get Fourier coefficient of the vorticity at next (n+1) time step
-def get_w_hat_np1(w_hat_n, w_hat_nm1, VgradW_hat_nm1, P, norm_factor, sgs_hat = 0.0):
-    
-    #compute jacobian
-    VgradW_hat_n = compute_VgradW_hat(w_hat_n, P)
-    
-    #solve for next time step according to AB/BDI2 scheme
-    w_hat_np1 = norm_factor*P*(2.0/dt*w_hat_n - 1.0/(2.0*dt)*w_hat_nm1 - \
-                               2.0*VgradW_hat_n + VgradW_hat_nm1 + mu*F_hat - sgs_hat)
-    
-    return w_hat_np1, VgradW_hat_n
-
-def draw():
-    plt.subplot(111)
-    plt.contourf(x, y, w_np1_HF, 100)
-    plt.tight_layout()
-
-#compute spectral filter
-def get_P(cutoff):
-    
-    P = np.ones([N, int(N/2+1)])
-    
-    for i in range(N):
-        for j in range(int(N/2+1)):
-            
-            if np.abs(kx[i, j]) > cutoff or np.abs(ky[i, j]) > cutoff:
-                P[i, j] = 0.0
-                
-    return P
-
-#compute spectral filter
-def get_P_full(cutoff):
-
-    P = np.ones([N, N])
-
-    for i in range(N):
-        for j in range(N):
-
-            if np.abs(kx_full[i, j]) > cutoff or np.abs(ky_full[i, j]) > cutoff:
-                P[i, j] = 0.0
-
-    return P
-
-#compute the energy and enstrophy at t_n
-def compute_E_and_Z(w_hat_n, verbose=True):
-
-    #compute stats using Fourier coefficients - is faster
-    #convert rfft2 coefficients to fft2 coefficients
-    w_hat_full = np.zeros([N, N]) + 0.0j
-    w_hat_full[0:N, 0:int(N/2+1)] = w_hat_n
-    w_hat_full[map_I, map_J] = np.conjugate(w_hat_n[I, J])
-    w_hat_full *= P_full
-    
-    #compute Fourier coefficients of stream function
-    psi_hat_full = w_hat_full/k_squared_no_zero_full
-    psi_hat_full[0,0] = 0.0
-
-    #compute energy and enstrophy (density)
-    Z = 0.5*np.sum(w_hat_full*np.conjugate(w_hat_full))/N**4
-    E = -0.5*np.sum(psi_hat_full*np.conjugate(w_hat_full))/N**4
-
-    if verbose:
-        #print 'Energy = ', E, ', enstrophy = ', Z
-        print('Energy = ', E.real, ', enstrophy = ', Z.real)
+Forced-dissipative 2D vorticity equations (ocean model), solved with a pseudo-spectral
+method and AB/BDI2 time stepping.
 
-    return E.real, Z.real
+Command line: python ocean.py <json input file(s) or EasyVVUQ runs directory> ...
+writes E_mean, Z_mean, E_std and Z_std of every sample to its output csv file.
 
-"""
-***************************
-* M A I N   P R O G R A M *
-***************************
+In Python: run(decay_time_nu, decay_time_mu, **opts) returns the QoI dict of a single
+sample, and run_batch(samples, **opts) integrates a list of samples simultaneously.
 """
 
 import numpy as np
-import os, h5py, sys, json
+import os, sys, json, glob
+import ocean_setup, ocean_fft, ocean_checkpoint
+from ocean_stepper import OceanStepper
+from ocean_output import DiagnosticsWriter
 #import matplotlib.pyplot as plt
 #from drawnow import drawnow
 
-####################################################################################
-# the json input file containing the values of the parameters, and the output file #
-####################################################################################
-
-json_input = sys.argv[1]
-
-with open(json_input, "r") as f:
-    inputs = json.load(f)
-    
-decay_time_nu = float(inputs['decay_time_nu'])
-decay_time_mu = float(inputs['decay_time_mu'])
-
-output_filename = inputs['outfile']
+HOME = os.path.abspath(os.path.dirname(__file__))
 
-#decay_time_nu = 5.0
-#decay_time_mu = 95.0
-#output_filename = 'output.csv'
+#the quantities of interest written to the output csv file
+QOI_COLS = ['E_mean', 'Z_mean', 'E_std', 'Z_std']
 
-###############################################################################
+#number of gridpoints in 1D (default), N = 2**I. Can be changed with the grid_exponent option
+I = 7
+N = 2**I
 
-#plt.close('all')
-#plt.rcParams['image.cmap'] = 'seismic'
+#time scale
+Omega = 7.292*10**-5
+day = 24*60**2*Omega
 
-HOME = os.path.abspath(os.path.dirname(__file__))
+"""
+*************************
+* S U B R O U T I N E S *
+*************************
+"""
 
-#number of gridpoints in 1D
-I = 7
-N = 2**I
+def draw(x, y, w_np1_HF):
+    plt.subplot(111)
+    plt.contourf(x, y, w_np1_HF, 100)
+    plt.tight_layout()
 
-#2D grid
-h = 2*np.pi/N
-axis = h*np.arange(1, N+1)
-axis = np.linspace(0, 2.0*np.pi, N)
-[x , y] = np.meshgrid(axis , axis)
+#compute the energy and enstrophy at t_n. w_hat_n can be a single (N, N/2+1) field
+#or a batch of fields with shape (B, N, N/2+1), in which case E and Z have shape (B,)
+def compute_E_and_Z(w_hat_n, weights_E, weights_Z, verbose=True):
 
-#frequencies
-k = np.fft.fftfreq(N)*N
+    #compute stats using the rfft2 Fourier coefficients directly - is faster. The weights
+    #account for the conjugate coefficients of the full fft2 spectrum, the spectral
+    #filter P_LF and 1/k^2 of the stream function, see ocean_setup.get_E_Z_weights
+    w_n = np.ascontiguousarray(w_hat_n).view(w_hat_n.real.dtype)
 
-kx = np.zeros([N, int(N/2+1)]) + 0.0j
-ky = np.zeros([N, int(N/2+1)]) + 0.0j
+    #compute energy and enstrophy (density)
+    Z = np.einsum('...ij,...ij,ij->...', w_n, w_n, weights_Z)
+    E = np.einsum('...ij,...ij,ij->...', w_n, w_n, weights_E)
 
-for i in range(N):
-    for j in range(int(N/2+1)):
-        kx[i, j] = 1j*k[j]
-        ky[i, j] = 1j*k[i]
+    if verbose:
+        #print 'Energy = ', E, ', enstrophy = ', Z
+        print('Energy = ', E, ', enstrophy = ', Z)
 
-k_squared = kx**2 + ky**2
-k_squared_no_zero = np.copy(k_squared)
-k_squared_no_zero[0,0] = 1.0
+    return E, Z
 
-kx_full = np.zeros([N, N]) + 0.0j
-ky_full = np.zeros([N, N]) + 0.0j
+#the grid, wavenumbers, spectral filters, forcing term and initial condition, in precision dtype,
+#on a grid of N = 2**I points in 1D
+def get_model_setup(dtype, fft, I=I):
 
-for i in range(N):
-    for j in range(N):
-        kx_full[i, j] = 1j*k[j]
-        ky_full[i, j] = 1j*k[i]
+    N = 2**I
+    setup = {'I': I, 'N': N}
 
-k_squared_full = kx_full**2 + ky_full**2
-k_squared_no_zero_full = np.copy(k_squared_full)
-k_squared_no_zero_full[0,0] = 1.0
+    #2D grid
+    h = 2*np.pi/N
+    axis = h*np.arange(1, N+1)
+    axis = np.linspace(0, 2.0*np.pi, N)
+    [x , y] = np.meshgrid(axis , axis)
+    setup['x'] = x; setup['y'] = y
 
-#cutoff in pseudospectral method
-Ncutoff = N/3
-Ncutoff_LF = 2**(I-1)/3 
+    #frequencies (read-only arrays, cached in ocean_setup)
+    kx, ky, k_squared, k_squared_no_zero = ocean_setup.get_wavenumbers(N, dtype)
+    setup.update(kx=kx, ky=ky, k_squared=k_squared, k_squared_no_zero=k_squared_no_zero)
 
-#spectral filter
-P = get_P(Ncutoff)
-P_LF = get_P(Ncutoff_LF)
-P_U = P - P_LF
+    #cutoff in pseudospectral method
+    setup['Ncutoff'] = N/3
+    setup['Ncutoff_LF'] = 2**(I-1)/3
 
-#spectral filter for the full FFT2 (used in compute_E_Z)
-P_full = get_P_full(Ncutoff_LF)
+    #spectral filters P, P_LF and P_U = P - P_LF
+    P, P_LF, P_U = ocean_setup.get_filters(N, setup['Ncutoff'], setup['Ncutoff_LF'], dtype)
+    setup.update(P=P, P_LF=P_LF, P_U=P_U)
 
-#map from the rfft2 coefficient indices to fft2 coefficient indices
-#Use: see compute_E_Z subroutine
-shift = np.zeros(N).astype('int')
-for i in range(1,N):
-    shift[i] = np.int(N-i)
-I = range(N);J = range(np.int(N/2+1))
-map_I, map_J = np.meshgrid(shift[I], shift[J])
-I, J = np.meshgrid(I, J)
+    #weights to compute the energy and enstrophy of the full spectrum filtered with P_LF
+    #from the rfft2 coefficients, see compute_E_Z subroutine
+    setup['weights_E'], setup['weights_Z'] = ocean_setup.get_E_Z_weights(N, setup['Ncutoff_LF'])
 
-#time scale
-Omega = 7.292*10**-5
-day = 24*60**2*Omega
+    #forcing term
+    F = 2**1.5*np.cos(5*x)*np.cos(5*y);
+    setup['F_hat'] = fft.rfft2(F.astype(dtype));
 
-nu = 1.0/(day*Ncutoff**2*decay_time_nu)
-mu = 1.0/(day*decay_time_mu)
-
-#start, end time (in days) + time step
-t = 0.0*day
-t_end = t + 2*day
-#initial time period during which no data is stored
-t_burn = 0.0*day
-dt = 0.01
-n_burn = np.ceil((t_burn-t)/dt).astype('int')
-n_steps = np.ceil((t_end-t)/dt).astype('int')
-
-#constant factor that appears in AB/BDI2 time stepping scheme, multiplying the Fourier coefficient w_hat_np1
-norm_factor = 1.0/(3.0/(2.0*dt) - nu*k_squared + mu)
-
-#############
-# USER KEYS #
-#############
-
-sim_ID = 'run1'
-#store the state at the end of the simulation
-state_store = False
-#restart from a stored state
-restart = False
-#plot the solution during executaion
-plot = False
-plot_frame_rate = np.floor(1.0*day/dt).astype('int')
-#store data
-store = True
-store_frame_rate = np.floor(0.25*day/dt).astype('int')
-#data lists
-E = []; Z = []
-
-#forcing term
-F = 2**1.5*np.cos(5*x)*np.cos(5*y);
-F_hat = np.fft.rfft2(F);
-
-#restart from a previous stored state (set restart = True, and set t to the end time of previous simulation)
-if restart == True:
-    
-    fname = HOME + '/restart/' + sim_ID + '_t_' + str(np.around(t/day,1)) + '.hdf5'
-    
-    #create HDF5 file
-    h5f = h5py.File(fname, 'r')
-    
-    for key in h5f.keys():
-        print(key)
-        vars()[key] = h5f[key][:]
-        
-    h5f.close()
-        
-#start from initial condition
-else:
-    
     #initial condition
     w = np.sin(4.0*x)*np.sin(4.0*y) + 0.4*np.cos(3.0*x)*np.cos(3.0*y) + \
         0.3*np.cos(5.0*x)*np.cos(5.0*y) + 0.02*np.sin(x) + 0.02*np.cos(y)
+    setup['w_hat_0'] = P*fft.rfft2(w.astype(dtype))
+
+    return setup
+
+#the time stepper for samples with the given decay times (arrays of shape (n_samples,)),
+#which owns the state at time n-1, n and n+1 and all work arrays
+def get_stepper(setup, decay_time_nu, decay_time_mu, dt, fft):
+
+    n_samples = decay_time_nu.size
+
+    #one value per sample, shaped (n_samples, 1, 1) to broadcast against the stacked fields
+    nu = 1.0/(day*setup['Ncutoff']**2*decay_time_nu.reshape([n_samples, 1, 1]))
+    mu = 1.0/(day*decay_time_mu.reshape([n_samples, 1, 1]))
+
+    #constant factor that appears in AB/BDI2 time stepping scheme, multiplying the Fourier coefficient w_hat_np1
+    norm_factor = 1.0/(3.0/(2.0*dt) - nu*setup['k_squared'] + mu)
+
+    return OceanStepper(setup['kx'], setup['ky'], setup['k_squared_no_zero'], setup['P'],
+                        norm_factor, mu, setup['F_hat'], dt, fft,
+                        n_samples=n_samples)
+
+#integrate the initial condition over n_spinup time steps with reference decay times,
+#or load the resulting state from the spin-up cache if it was computed before
+def get_spinup_state(setup, n_spinup, decay_time_nu, decay_time_mu, spinup_dir,
+                     dt, dtype, fft):
+
+    N = setup['N']
+    fname = ocean_checkpoint.spinup_filename(spinup_dir, N, dt, n_spinup,
+                                             decay_time_nu, decay_time_mu, dtype)
+
+    if os.path.exists(fname):
+        print('Loading spin-up state from', fname)
+        return ocean_checkpoint.load_checkpoint(fname)[0]
+
+    print('Computing spin-up state', fname)
+
+    spinup_stepper = get_stepper(setup, np.array([decay_time_nu]), np.array([decay_time_mu]),
+                                 dt, fft)
+    spinup_stepper.set_state(setup['w_hat_0'], setup['w_hat_0'])
+    for n in range(n_spinup):
+        spinup_stepper.step()
+
+    state = ocean_checkpoint.get_state(spinup_stepper)
+    ocean_checkpoint.save_checkpoint(fname, state, {'N': N, 'dt': dt, 'n_spinup': n_spinup,
+                                                    'decay_time_nu': decay_time_nu,
+                                                    'decay_time_mu': decay_time_mu,
+                                                    'dtype': dtype})
+    return state
+
+#get an option from opts, the json input of the first sample, or otherwise from the
+#environment variable OCEAN_<KEY>, e.g. 'fft_backend' or OCEAN_FFT_BACKEND
+def get_option(key, opts, samples, default=None):
+    if key in opts:
+        return opts[key]
+    return samples[0].get(key, os.environ.get('OCEAN_' + key.upper(), default))
+
+#read the parameter sets of all samples that must be integrated. Every command-line
+#argument can be either
+#   - a json input file containing a single parameter set (the EasyVVUQ ocean_in.json),
+#   - a json file containing a list of parameter sets,
+#   - an EasyVVUQ runs directory, from which all <run_dir>/ocean_in.json files are read.
+#     The output file of each sample is then written to its own run directory.
+def read_inputs(args, input_filename='ocean_in.json'):
+
+    samples = []
+
+    for arg in args:
+
+        if os.path.isdir(arg):
+            run_dirs = sorted(os.path.dirname(fname) for fname in
+                              glob.glob(os.path.join(arg, '*', input_filename)))
+            if len(run_dirs) == 0:
+                print('No', input_filename, 'files found in', arg)
+            for run_dir in run_dirs:
+                with open(os.path.join(run_dir, input_filename), "r") as f:
+                    inputs = json.load(f)
+                inputs['outfile'] = os.path.join(run_dir, inputs['outfile'])
+                samples.append(inputs)
+        else:
+            with open(arg, "r") as f:
+                inputs = json.load(f)
+            if isinstance(inputs, list):
+                samples.extend(inputs)
+            else:
+                samples.append(inputs)
+
+    return samples
+
+#write the QoIs of a single sample to its output csv file
+def write_output(output_filename, qois):
+    header = ','.join(QOI_COLS)
+    np.savetxt(output_filename, np.array([qois[qoi] for qoi in QOI_COLS]).reshape([1,4]),
+               delimiter=", ", comments='',
+               header=header)
 
-    #initial Fourier coefficients at time n and n-1
-    w_hat_n_HF = P*np.fft.rfft2(w)
-    w_hat_nm1_HF = np.copy(w_hat_n_HF)
-   
-    #initial Fourier coefficients of the jacobian at time n and n-1
-    VgradW_hat_n_HF = compute_VgradW_hat(w_hat_n_HF, P)
-    VgradW_hat_nm1_HF = np.copy(VgradW_hat_n_HF)
-    
-    t = 0.0
-
-print('Solving forced dissipative vorticity equations')
-print('decay_time_nu = ', decay_time_nu)
-print('decay_time_mu = ', decay_time_mu)
-print('Grid = ', N, 'x', N)
-print('t_begin = ', t/day, 'days')
-print('t_end = ', t_end/day, 'days')
-
-#some counters
-j = 0; j2 = 0
-
-#time loop
-for n in range(n_steps):
-    
-    #solve for next time step
-    w_hat_np1_HF, VgradW_hat_n_HF = get_w_hat_np1(w_hat_n_HF, w_hat_nm1_HF, VgradW_hat_nm1_HF, P, norm_factor)
-
-    #plot solution every plot_frame_rate. Requires drawnow() package
-    if j == plot_frame_rate and plot == True:
-        j = 0
-
-        w_np1_HF = np.fft.irfft2(w_hat_np1_HF)
-        drawnow(draw)
+"""
+***************************
+* M A I N   P R O G R A M *
+***************************
+"""
 
+def run_batch(samples, **opts):
+    """
+    Integrates all samples simultaneously, with the vorticity fields stacked as a
+    (n_samples, N, N/2+1) array.
+
+    Parameters
+    ----------
+    samples : list of dicts with the keys 'decay_time_nu' and 'decay_time_mu', and
+              optionally 'outfile', the output csv file of the sample, and 'run_dir',
+              the directory of the time series and checkpoint files of the sample (by
+              default the directory of 'outfile'). The options below can also be
+              specified as keys of the first sample.
+    opts : options, which override the sample keys and the OCEAN_<KEY> environment
+           variables, e.g. grid_exponent, fft_backend, fft_workers, dtype,
+           checkpoint_interval, checkpoint_file, timeseries_file, spinup_days and verbose
+
+    Returns
+    -------
+    list with a dict of QoIs (E_mean, Z_mean, E_std, Z_std) per sample
+    """
+
+    ####################################################################################
+    # the json input file containing the values of the parameters, and the output file #
+    ####################################################################################
+
+    n_samples = len(samples)
+
+    decay_time_nu = np.array([float(sample['decay_time_nu']) for sample in samples])
+    decay_time_mu = np.array([float(sample['decay_time_mu']) for sample in samples])
+
+    output_filenames = [sample.get('outfile') for sample in samples]
+
+    #the directory of the time series and checkpoint files of each sample, None if unknown
+    run_dirs = []
+    for sample in samples:
+        if sample.get('run_dir') is not None:
+            run_dirs.append(sample['run_dir'])
+        elif sample.get('outfile') is not None:
+            run_dirs.append(os.path.dirname(sample['outfile']))
+        else:
+            run_dirs.append(None)
+
+    #print progress information
+    verbose = get_option('verbose', opts, samples, True) not in [False, 'False', 'false', '0']
+
+    #number of gridpoints in 1D, N = 2**grid_exponent
+    grid_exponent = int(get_option('grid_exponent', opts, samples, I))
+    N = 2**grid_exponent
+
+    #FFT backend ('numpy', 'scipy' or 'pyfftw') and its number of threads
+    fft = ocean_fft.get_fft_backend(get_option('fft_backend', opts, samples),
+                                    get_option('fft_workers', opts, samples))
+
+    #the floating point precision of the solver, 'float64' or 'float32'. The latter halves the
+    #memory use and bandwidth, at the cost of accuracy (see compare_precision.py)
+    dtype = np.dtype(get_option('dtype', opts, samples, 'float64')).name
+    if dtype not in ['float64', 'float32']:
+        raise ValueError("dtype must be 'float64' or 'float32', not '{}'".format(dtype))
+
+    #write a checkpoint every checkpoint_interval time steps (0 = never). If the checkpoint file
+    #exists at startup, the simulation is resumed from it. By default, the checkpoint file is
+    #located in the run directory of the first sample.
+    checkpoint_interval = int(get_option('checkpoint_interval', opts, samples, 0))
+    checkpoint_file = get_option('checkpoint_file', opts, samples)
+    if checkpoint_file is None:
+        if checkpoint_interval > 0 and run_dirs[0] is None:
+            raise ValueError('checkpoint_interval requires a checkpoint_file, or an outfile or run_dir '
+                             'of the first sample')
+        checkpoint_file = os.path.join(run_dirs[0] or '', 'ocean_checkpoint.hdf5')
+
+    #stream the time series of the energy and enstrophy to a compressed HDF5 file with this name,
+    #located in the run directory of each sample. No time series are stored if None.
+    timeseries_file = get_option('timeseries_file', opts, samples)
+    if timeseries_file is not None and None in run_dirs:
+        raise ValueError('timeseries_file requires an outfile or run_dir for every sample')
+
+    #start all samples from a state obtained by integrating the initial condition over spinup_days
+    #days, with reference decay times. This state is computed once, and cached in spinup_dir.
+    spinup_days = float(get_option('spinup_days', opts, samples, 0.0))
+    spinup_decay_time_nu = float(get_option('spinup_decay_time_nu', opts, samples, 5.0))
+    spinup_decay_time_mu = float(get_option('spinup_decay_time_mu', opts, samples, 90.0))
+    spinup_dir = get_option('spinup_dir', opts, samples, HOME + '/restart')
+
+    ###############################################################################
+
+    #plt.close('all')
+    #plt.rcParams['image.cmap'] = 'seismic'
+
+    setup = get_model_setup(dtype, fft, grid_exponent)
+
+    #start, end time (in days) + time step
+    t = 0.0*day
+    t_end = t + 2*day
+    #initial time period during which no data is stored
+    t_burn = 0.0*day
+    dt = 0.01
+    n_burn = np.ceil((t_burn-t)/dt).astype('int')
+    n_steps = np.ceil((t_end-t)/dt).astype('int')
+
+    #############
+    # USER KEYS #
+    #############
+
+    #plot the solution during executaion
+    plot = False
+    plot_frame_rate = np.floor(1.0*day/dt).astype('int')
     #store data
-    if j2 == store_frame_rate and store == True:
-
-        j2 = 0
-        
-        if n >= n_burn:
-            E_n , Z_n = compute_E_and_Z(w_hat_np1_HF, verbose=False)
-            E.append(E_n); Z.append(Z_n)
-
-    #update variables
-    t += dt; j += 1; j2 += 1
-    w_hat_nm1_HF = np.copy(w_hat_n_HF)
-    w_hat_n_HF = np.copy(w_hat_np1_HF)
-    VgradW_hat_nm1_HF = np.copy(VgradW_hat_n_HF)
-    
-    if np.mod(n, np.round(day/dt)) == 0:
-        print('n = ', n, 'of', n_steps)
-    
-#store the state of the system to allow for a simulation restart at t > 0
-if state_store == True:
-    
-    keys = ['w_hat_nm1_HF', 'w_hat_n_HF', 'VgradW_hat_nm1_HF']
-    
-    if os.path.exists(HOME + '/restart') == False:
-        os.makedirs(HOME + '/restart')
-    
-    #cPickle.dump(state, open(HOME + '/restart/' + sim_ID + '_t_' + str(np.around(t_end/day,1)) + '.pickle', 'w'))
-    
-    fname = HOME + '/restart/' + sim_ID + '_t_' + str(np.around(t_end/day,1)) + '.hdf5'
-    
-    #create HDF5 file
-    h5f = h5py.File(fname, 'w')
-    
-    #store numpy sample arrays as individual datasets in the hdf5 file
-    for key in keys:
-        qoi = eval(key)
-        h5f.create_dataset(key, data = qoi)
-        
-    h5f.close()
-
-if store == True:
-    #output csv file    
-    header = 'E_mean,Z_mean,E_std,Z_std'
-    np.savetxt(output_filename, np.array([np.mean(E), np.mean(Z), np.std(E), np.std(Z)]).reshape([1,4]), 
-               delimiter=", ", comments='',
-               header=header)
-#plt.show()
+    store = True
+    store_frame_rate = np.floor(0.25*day/dt).astype('int')
+
+    #running statistics of the energy and enstrophy, and the optional time series files
+    if timeseries_file is None:
+        writer = DiagnosticsWriter(n_samples)
+    else:
+        writer = DiagnosticsWriter(n_samples, [os.path.join(run_dir, timeseries_file)
+                                               for run_dir in run_dirs])
+
+    #initial Fourier coefficients at time n and n-1, identical for all samples
+    if spinup_days > 0.0:
+        n_spinup = np.ceil(spinup_days*day/dt).astype('int')
+        state = get_spinup_state(setup, n_spinup, spinup_decay_time_nu, spinup_decay_time_mu,
+                                 spinup_dir, dt, dtype, fft)
+    else:
+        #the initial Fourier coefficients of the jacobian are computed by the stepper
+        state = {'w_hat_nm1': setup['w_hat_0'], 'w_hat_n': setup['w_hat_0'], 'VgradW_hat_nm1': None}
+
+    stepper = get_stepper(setup, decay_time_nu, decay_time_mu, dt, fft)
+    stepper.set_state(state['w_hat_nm1'], state['w_hat_n'], state['VgradW_hat_nm1'])
+
+    #some counters
+    t = 0.0; n_start = 0; j = 0; j2 = 0
+
+    #store the state and the diagnostics so far, to resume the simulation from step n
+    def store_checkpoint(n):
+
+        datasets = ocean_checkpoint.get_state(stepper)
+        datasets.update(writer.get_state())
+
+        ocean_checkpoint.save_checkpoint(checkpoint_file, datasets,
+                                         {'n': n, 't': t, 'j': j, 'j2': j2,
+                                          'N': N, 'dt': dt, 'spinup_days': spinup_days,
+                                          'dtype': dtype,
+                                          'decay_time_nu': decay_time_nu,
+                                          'decay_time_mu': decay_time_mu})
+
+    #resume from the checkpoint of a previous, interrupted, run of the same samples
+    if os.path.exists(checkpoint_file):
+
+        datasets, attrs = ocean_checkpoint.load_checkpoint(checkpoint_file)
+
+        if ocean_checkpoint.matches(attrs, N=N, dt=dt, spinup_days=spinup_days, dtype=dtype,
+                                    decay_time_nu=decay_time_nu, decay_time_mu=decay_time_mu):
+            print('Resuming from checkpoint', checkpoint_file, 'at step', attrs['n'])
+            stepper.set_state(datasets['w_hat_nm1'], datasets['w_hat_n'], datasets['VgradW_hat_nm1'])
+            t = attrs['t']; n_start = attrs['n']; j = attrs['j']; j2 = attrs['j2']
+            writer.set_state(datasets)
+        else:
+            print('Checkpoint', checkpoint_file, 'belongs to other samples, it is ignored')
+
+    if verbose:
+        print('Solving forced dissipative vorticity equations')
+        print('Number of samples = ', n_samples)
+        print('decay_time_nu = ', decay_time_nu)
+        print('decay_time_mu = ', decay_time_mu)
+        print('Grid = ', N, 'x', N)
+        print('FFT backend = ', fft.name, 'with', fft.workers, 'worker(s)')
+        print('Precision = ', dtype)
+        print('t_begin = ', t/day, 'days')
+        print('t_end = ', t_end/day, 'days')
+
+    #time loop
+    for n in range(n_start, n_steps):
+
+        #solve for next time step, the new state is rotated into stepper.w_hat_n
+        w_hat_np1_HF = stepper.step()
+
+        #plot solution every plot_frame_rate. Requires drawnow() package
+        if j == plot_frame_rate and plot == True:
+            j = 0
+
+            w_np1_HF = fft.irfft2(w_hat_np1_HF)
+            drawnow(lambda: draw(setup['x'], setup['y'], w_np1_HF[0]))
+
+        #store data
+        if j2 == store_frame_rate and store == True:
+
+            j2 = 0
+
+            if n >= n_burn:
+                E_n , Z_n = compute_E_and_Z(w_hat_np1_HF, setup['weights_E'], setup['weights_Z'],
+                                            verbose=False)
+                #time of w_hat_np1 in days
+                writer.append((t + dt)/day, E_n, Z_n)
+
+        #update variables
+        t += dt; j += 1; j2 += 1
+
+        if verbose and np.mod(n, np.round(day/dt)) == 0:
+            print('n = ', n, 'of', n_steps)
+
+        #store a checkpoint, from which the simulation is resumed at step n+1
+        if checkpoint_interval > 0 and np.mod(n + 1, checkpoint_interval) == 0:
+            store_checkpoint(n + 1)
+
+    #store the final state of the system
+    if checkpoint_interval > 0:
+        store_checkpoint(n_steps)
+
+    writer.flush()
+    #mean and standard deviation of E and Z, with shape (2, n_samples)
+    mean = writer.mean(); std = writer.std()
+
+    results = []
+    for s, output_filename in enumerate(output_filenames):
+        qois = {'E_mean': float(mean[0, s]), 'Z_mean': float(mean[1, s]),
+                'E_std': float(std[0, s]), 'Z_std': float(std[1, s])}
+        results.append(qois)
+        #output csv file, one per sample
+        if store == True and output_filename is not None:
+            write_output(output_filename, qois)
+
+    return results
+    #plt.show()
+
+def run(decay_time_nu, decay_time_mu, **opts):
+    """
+    Integrates a single sample, and returns a dict with the QoIs E_mean, Z_mean,
+    E_std and Z_std. No output file is written, unless opts contains 'outfile'.
+    Time series and checkpoint files are written to opts['run_dir'], by default
+    the directory of 'outfile', or otherwise the current directory.
+    See run_batch for the options.
+    """
+    outfile = opts.pop('outfile', None)
+    run_dir = opts.pop('run_dir', None)
+    if run_dir is None:
+        run_dir = os.path.dirname(outfile) if outfile is not None else ''
+    sample = {'decay_time_nu': decay_time_nu, 'decay_time_mu': decay_time_mu,
+              'outfile': outfile, 'run_dir': run_dir}
+    return run_batch([sample], **opts)[0]
+
+if __name__ == "__main__":
+
+    #All samples are integrated simultaneously. Use e.g. 'python ocean.py ocean_in.json' for a
+    #single sample, or 'python ocean.py <campaign_dir>/runs' to run an entire ensemble in one process.
+    samples = read_inputs(sys.argv[1:])
+
+    if len(samples) == 0:
+        sys.exit('No samples to integrate, usage: python ocean.py <json input or runs dir> ...')
+
+    run_batch(samples)
@@ -0,0 +1,78 @@
+"""
+===============================================================================
+CHECKPOINTS OF THE 2D OCEAN MODEL
+-------------------------------------------------------------------------------
+A checkpoint is an HDF5 file with the solver state (w_hat_nm1, w_hat_n,
+VgradW_hat_nm1) and the diagnostics accumulated so far as datasets, and scalars
+such as the time and step counter as attributes. Checkpoints are written to a
+temporary file which is then renamed, such that a job which is killed while
+writing never leaves a corrupt checkpoint behind.
+
+The same format is used for the spin-up cache: the state obtained by integrating
+the analytic initial condition over a spin-up period with reference parameters,
+from which all samples of a campaign can start.
+===============================================================================
+"""
+
+import os
+import h5py
+import numpy as np
+
+__license__ = "LGPL"
+
+#the keys of the solver state, attributes of OceanStepper
+STATE_KEYS = ['w_hat_nm1', 'w_hat_n', 'VgradW_hat_nm1']
+
+def save_checkpoint(fname, datasets, attrs={}):
+    """
+    Atomically writes a dict of numpy arrays (datasets) and a dict of scalars (attrs)
+    to the HDF5 file fname.
+    """
+    dirname = os.path.dirname(os.path.abspath(fname))
+    if not os.path.exists(dirname):
+        os.makedirs(dirname, exist_ok=True)
+
+    tmp_fname = fname + '.tmp{}'.format(os.getpid())
+
+    with h5py.File(tmp_fname, 'w') as h5f:
+        for key, data in datasets.items():
+            h5f.create_dataset(key, data=data)
+        for key, value in attrs.items():
+            h5f.attrs[key] = value
+
+    os.replace(tmp_fname, fname)
+
+def load_checkpoint(fname):
+    """
+    Reads a checkpoint written by save_checkpoint. Returns the dicts datasets and attrs.
+    """
+    with h5py.File(fname, 'r') as h5f:
+        datasets = {key: h5f[key][()] for key in h5f.keys()}
+        attrs = dict(h5f.attrs)
+
+    return datasets, attrs
+
+def get_state(stepper):
+    """
+    The solver state of an OceanStepper, as a dict of arrays.
+    """
+    return {key: getattr(stepper, key) for key in STATE_KEYS}
+
+def spinup_filename(spinup_dir, N, dt, n_spinup, decay_time_nu, decay_time_mu, dtype='float64'):
+    """
+    The name of the spin-up cache file, which encodes everything the spin-up state
+    depends on.
+    """
+    fname = 'spinup_N{}_dt{}_steps{}_nu{}_mu{}_{}.hdf5'.format(N, dt, n_spinup, decay_time_nu,
+                                                             decay_time_mu, np.dtype(dtype).name)
+    return os.path.join(spinup_dir, fname)
+
+def matches(attrs, **expected):
+    """
+    Checks if the checkpoint attributes are equal to the expected values, e.g. to make
+    sure a checkpoint belongs to the same samples and time step.
+    """
+    for key, value in expected.items():
+        if key not in attrs or not np.array_equal(attrs[key], value):
+            return False
+    return True
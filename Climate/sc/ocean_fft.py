@@ -0,0 +1,146 @@
+"""
+===============================================================================
+FFT BACKENDS FOR THE 2D OCEAN MODEL
+-------------------------------------------------------------------------------
+All backends transform over the last two axes, such that a single (N, N) field
+and a batch of fields with shape (B, N, N) are handled alike. Available are
+    - 'numpy': np.fft (single threaded, the default),
+    - 'scipy': scipy.fft with a workers=<number of threads> argument,
+    - 'pyfftw': pyFFTW with persistent FFTW plans on pre-aligned buffers.
+The backend is selected via the 'fft_backend' and 'fft_workers' keys of the json
+input file, or via the OCEAN_FFT_BACKEND and OCEAN_FFT_WORKERS environment
+variables. If the requested backend cannot be imported, numpy is used instead.
+===============================================================================
+"""
+
+import os
+import numpy as np
+
+__license__ = "LGPL"
+
+#np.fft.rfft2 accepts an out argument as of numpy 2.0. The out argument of np.fft.irfft2
+#is not used, since it returns incorrect results for 2D transforms (numpy 2.4)
+_NUMPY_FFT_OUT = np.lib.NumpyVersion(np.__version__) >= '2.0.0'
+
+class NumpyFFT:
+    """
+    FFT backend using np.fft.
+    """
+    name = 'numpy'
+
+    def __init__(self, workers=None):
+        self.workers = 1
+
+    def rfft2(self, a, out=None):
+        if out is None:
+            return np.fft.rfft2(a)
+        if _NUMPY_FFT_OUT:
+            return np.fft.rfft2(a, out=out)
+        out[...] = np.fft.rfft2(a)
+        return out
+
+    def irfft2(self, a, out=None):
+        if out is None:
+            return np.fft.irfft2(a)
+        out[...] = np.fft.irfft2(a)
+        return out
+
+class ScipyFFT:
+    """
+    FFT backend using scipy.fft, multi-threaded over 'workers' threads.
+    """
+    name = 'scipy'
+
+    def __init__(self, workers=None):
+        import scipy.fft
+        self._fft = scipy.fft
+        self.workers = 1 if workers is None else workers
+
+    def rfft2(self, a, out=None):
+        if out is None:
+            return self._fft.rfft2(a, workers=self.workers)
+        out[...] = self._fft.rfft2(a, workers=self.workers)
+        return out
+
+    def irfft2(self, a, out=None):
+        if out is None:
+            return self._fft.irfft2(a, workers=self.workers)
+        out[...] = self._fft.irfft2(a, workers=self.workers)
+        return out
+
+class PyFFTW:
+    """
+    FFT backend using pyFFTW. One FFTW plan, with its own aligned input and output
+    buffers, is created per (direction, shape, dtype) on first use and reused afterwards.
+    """
+    name = 'pyfftw'
+
+    def __init__(self, workers=None, planner_effort='FFTW_MEASURE'):
+        import pyfftw
+        self._pyfftw = pyfftw
+        self.workers = 1 if workers is None else workers
+        if self.workers < 0:
+            self.workers = os.cpu_count()
+        self.planner_effort = planner_effort
+        self._plans = {}
+
+    def _get_plan(self, direction, shape, dtype):
+
+        key = (direction, shape, np.dtype(dtype))
+
+        if key not in self._plans:
+            builder = getattr(self._pyfftw.builders, direction)
+            #planning with FFTW_MEASURE overwrites the buffer, so plan on an empty array
+            buffer = self._pyfftw.empty_aligned(shape, dtype=dtype)
+            self._plans[key] = builder(buffer, axes=(-2, -1), threads=self.workers,
+                                       planner_effort=self.planner_effort,
+                                       avoid_copy=False, auto_align_input=True)
+
+        return self._plans[key]
+
+    def _execute(self, direction, a, out):
+
+        plan = self._get_plan(direction, a.shape, a.dtype)
+        #copy into the aligned input buffer, which the c2r transform may also destroy
+        plan.input_array[...] = a
+        #calling the plan (rather than plan.execute) also normalises the inverse transform
+        result = plan()
+
+        #the output buffer is reused by the next call, so it cannot be returned as is
+        if out is None:
+            return result.copy()
+        out[...] = result
+        return out
+
+    def rfft2(self, a, out=None):
+        return self._execute('rfft2', a, out)
+
+    def irfft2(self, a, out=None):
+        return self._execute('irfft2', a, out)
+
+BACKENDS = {'numpy': NumpyFFT, 'scipy': ScipyFFT, 'pyfftw': PyFFTW}
+
+def get_fft_backend(name=None, workers=None):
+    """
+    Returns an FFT backend object. If name or workers is None, the OCEAN_FFT_BACKEND
+    and OCEAN_FFT_WORKERS environment variables are used, and otherwise a single
+    threaded numpy backend. A negative number of workers means all available cores.
+    """
+    if name is None:
+        name = os.environ.get('OCEAN_FFT_BACKEND', 'numpy')
+    if workers is None and 'OCEAN_FFT_WORKERS' in os.environ:
+        workers = os.environ['OCEAN_FFT_WORKERS']
+    if workers is not None:
+        workers = int(workers)
+
+    name = name.lower()
+    if name not in BACKENDS:
+        print('Unknown FFT backend', name, ', choose from', list(BACKENDS.keys()))
+        print('Using numpy instead')
+        return NumpyFFT()
+
+    try:
+        return BACKENDS[name](workers=workers)
+    except ImportError:
+        print('FFT backend', name, 'could not be imported, using numpy instead')
+        return NumpyFFT()
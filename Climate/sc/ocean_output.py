@@ -0,0 +1,129 @@
+"""
+===============================================================================
+STREAMING DIAGNOSTICS OUTPUT OF THE 2D OCEAN MODEL
+-------------------------------------------------------------------------------
+The DiagnosticsWriter keeps the running mean and standard deviation of the
+diagnostics (energy E and enstrophy Z) of all samples, and optionally streams
+their time series to one HDF5 file per sample. Rows are collected in a fixed-size
+buffer and appended block by block to chunked, compressed datasets 't', 'E' and
+'Z', so the memory use does not grow with the length of the run. The time series
+can be read back with TimeSeriesDecoder (Climate/timeseries_decoder.py).
+===============================================================================
+"""
+
+import h5py
+import numpy as np
+
+__license__ = "LGPL"
+
+class DiagnosticsWriter:
+    """
+    Parameters
+    ----------
+    n_samples : number of samples integrated simultaneously
+    filenames : list of HDF5 file names, one per sample, or None to only keep
+                the running statistics
+    names : names of the diagnostics
+    block_size : number of rows buffered in memory, also the HDF5 chunk size
+    compression : HDF5 compression filter
+    """
+    def __init__(self, n_samples, filenames=None, names=('E', 'Z'), block_size=1024,
+                 compression='gzip'):
+
+        self.n_samples = n_samples
+        self.filenames = filenames
+        self.names = list(names)
+        self.block_size = block_size
+        self.compression = compression
+
+        #number of appended rows, and rows already written to file
+        self.n = 0
+        self.n_written = 0
+
+        #running mean and sum of squared deviations (Welford's algorithm)
+        self._mean = np.zeros([len(self.names), n_samples])
+        self._M2 = np.zeros([len(self.names), n_samples])
+        self._delta = np.zeros([len(self.names), n_samples])
+
+        if filenames is not None:
+            #buffered rows of t and all diagnostics
+            self._buffer = np.zeros([block_size, 1 + len(self.names), n_samples])
+            self._n_buffered = 0
+
+    def append(self, t, *values):
+        """
+        Appends the diagnostics of all samples at time t, one array of shape
+        (n_samples,) per name.
+        """
+        self.n += 1
+
+        #update the running statistics
+        delta = self._delta
+        np.subtract(values, self._mean, out=delta)
+        self._mean += delta/self.n
+        self._M2 += delta*(values - self._mean)
+
+        if self.filenames is not None:
+            row = self._buffer[self._n_buffered]
+            row[0] = t
+            row[1:] = values
+            self._n_buffered += 1
+            if self._n_buffered == self.block_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered rows to the HDF5 files.
+        """
+        if self.filenames is None:
+            return
+
+        block = self._buffer[0:self._n_buffered]
+        n_new = self.n_written + self._n_buffered
+
+        for s, fname in enumerate(self.filenames):
+
+            #a new file at the start of the run, afterwards (and on resume) append to it
+            with h5py.File(fname, 'w' if self.n_written == 0 else 'a') as h5f:
+                for i, name in enumerate(['t'] + self.names):
+                    if name not in h5f:
+                        h5f.create_dataset(name, shape=(0,), maxshape=(None,), dtype='f8',
+                                           chunks=(self.block_size,),
+                                           compression=self.compression)
+                    dataset = h5f[name]
+                    #on resume, rows written after the checkpoint are discarded
+                    dataset.resize((n_new,))
+                    dataset[self.n_written:n_new] = block[:, i, s]
+
+        self.n_written = n_new
+        self._n_buffered = 0
+
+    def mean(self):
+        """
+        The mean of the diagnostics, shape (len(names), n_samples).
+        """
+        return np.copy(self._mean)
+
+    def std(self):
+        """
+        The standard deviation of the diagnostics, shape (len(names), n_samples).
+        """
+        return np.sqrt(self._M2/self.n)
+
+    def get_state(self):
+        """
+        Flushes the buffer and returns the state of the writer, to be stored in a checkpoint.
+        """
+        self.flush()
+        return {'diagnostics_n': self.n, 'diagnostics_mean': self._mean,
+                'diagnostics_M2': self._M2}
+
+    def set_state(self, state):
+        """
+        Restores the state of the writer from a checkpoint. Rows that were written to
+        file after the checkpoint are overwritten.
+        """
+        self.n = int(state['diagnostics_n'])
+        self.n_written = self.n
+        self._mean[...] = state['diagnostics_mean']
+        self._M2[...] = state['diagnostics_M2']
@@ -0,0 +1,102 @@
+"""
+===============================================================================
+SPECTRAL SETUP OF THE 2D OCEAN MODEL
+-------------------------------------------------------------------------------
+Wavenumber grids, spectral filters and energy/enstrophy weights of the rfft2
+coefficients used by ocean.py, all in the (N, N/2+1) rfft2 layout. All arrays are
+built with numpy broadcasting and cached per (N, cutoff), so repeated runs and batched ensembles within one process construct them only once.
+The cached arrays are shared and therefore made read-only. The arrays are computed
+in double precision, and optionally rounded to single precision (dtype='float32',
+in which case the complex arrays are complex64).
+===============================================================================
+"""
+
+import functools
+import numpy as np
+
+__license__ = "LGPL"
+
+def _read_only(*arrays):
+    for array in arrays:
+        array.flags.writeable = False
+    return arrays
+
+def _as_dtype(arrays, dtype):
+    #real arrays are converted to dtype, complex arrays to the complex dtype of the same precision
+    complex_dtype = np.result_type(dtype, np.complex64)
+    return _read_only(*[array.astype(complex_dtype if np.iscomplexobj(array) else dtype)
+                        for array in arrays])
+
+@functools.lru_cache(maxsize=None)
+def get_wavenumbers(N, dtype='float64'):
+    """
+    Returns the (imaginary) wavenumbers kx, ky of the rfft2 coefficients, with shape
+    (N, N/2+1), and k_squared = kx**2 + ky**2 plus a copy with k_squared[0,0] = 1.
+    """
+    if np.dtype(dtype) != np.float64:
+        return _as_dtype(get_wavenumbers(N), dtype)
+
+    k = np.fft.fftfreq(N)*N
+    shape = (N, int(N/2+1))
+
+    kx = np.broadcast_to(1j*k[np.newaxis, 0:int(N/2+1)], shape).copy()
+    ky = np.broadcast_to(1j*k[:, np.newaxis], shape).copy()
+
+    k_squared = kx**2 + ky**2
+    k_squared_no_zero = np.copy(k_squared)
+    k_squared_no_zero[0,0] = 1.0
+
+    return _read_only(kx, ky, k_squared, k_squared_no_zero)
+
+@functools.lru_cache(maxsize=None)
+def get_P(N, cutoff, dtype='float64'):
+    """
+    Spectral filter for the rfft2 coefficients: 1 if both |kx| and |ky| are
+    smaller than or equal to cutoff, 0 otherwise.
+    """
+    if np.dtype(dtype) != np.float64:
+        return _as_dtype([get_P(N, cutoff)], dtype)[0]
+
+    kx, ky = get_wavenumbers(N)[0:2]
+    P = np.where((np.abs(kx) > cutoff) | (np.abs(ky) > cutoff), 0.0, 1.0)
+    return _read_only(P)[0]
+
+@functools.lru_cache(maxsize=None)
+def get_filters(N, cutoff, cutoff_LF, dtype='float64'):
+    """
+    Returns the filters P (cutoff), P_LF (cutoff_LF) and the unresolved part P_U = P - P_LF.
+    """
+    P = get_P(N, cutoff, dtype)
+    P_LF = get_P(N, cutoff_LF, dtype)
+    P_U = P - P_LF
+    _read_only(P_U)
+
+    return P, P_LF, P_U
+
+@functools.lru_cache(maxsize=None)
+def get_E_Z_weights(N, cutoff):
+    """
+    Weights to compute the energy E = 0.5*sum(|w_hat_full|^2/|k|^2)/N^4 and the enstrophy
+    Z = 0.5*sum(|w_hat_full|^2)/N^4 of the filtered full fft2 spectrum directly from the
+    rfft2 coefficients w_hat. Every column of w_hat except kx = 0 and the Nyquist column
+    also represents its complex conjugate in the full spectrum, and is counted twice.
+    The weights are repeated along the last axis, to be applied to the interleaved real
+    and imaginary parts w_hat.view(float), and include the spectral filter P(cutoff).
+    Returns weights_E, weights_Z, with shape (N, N+2), always in double precision.
+    """
+    k_squared_no_zero = get_wavenumbers(N)[3]
+    P = get_P(N, cutoff)
+
+    weights = 2.0*np.ones(int(N/2+1))
+    weights[0] = 1.0
+    if np.mod(N, 2) == 0:
+        weights[-1] = 1.0
+
+    weights_Z = 0.5*weights*P/N**4
+    weights_E = weights_Z/np.abs(k_squared_no_zero)
+    weights_E[0,0] = 0.0
+
+    weights_E = np.repeat(weights_E, 2, axis=-1)
+    weights_Z = np.repeat(weights_Z, 2, axis=-1)
+
+    return _read_only(weights_E, weights_Z)
@@ -0,0 +1,140 @@
+"""
+===============================================================================
+ALLOCATION-FREE AB/BDI2 TIME STEPPER FOR THE 2D OCEAN MODEL
+-------------------------------------------------------------------------------
+The stepper owns the Fourier coefficients of the vorticity at time levels n-1, n
+and n+1, the Jacobian at n-1 and n, and all scratch arrays. Every operation writes
+into these preallocated arrays via the out= argument of the numpy ufuncs and the
+FFT backend, and the time levels are rotated by swapping references, so stepping
+creates no new state arrays. The results are identical to the original
+compute_VgradW_hat and get_w_hat_np1 subroutines of ocean.py.
+===============================================================================
+"""
+
+import numpy as np
+
+__license__ = "LGPL"
+
+class OceanStepper:
+    """
+    AB/BDI2 time stepper for a batch of n_samples vorticity fields, with
+    spectral state arrays of shape (n_samples, N, N/2+1). The precision of all
+    arrays follows the dtype of kx (complex128 or complex64).
+
+    Parameters
+    ----------
+    kx, ky, k_squared_no_zero : wavenumbers of the rfft2 coefficients, see ocean_setup
+    P : spectral filter
+    norm_factor : the factor 1/(3/(2dt) - nu*k^2 + mu), per sample
+    mu : the forcing/drag coefficient, shape (n_samples, 1, 1)
+    F_hat : Fourier coefficients of the forcing term
+    dt : time step
+    fft : FFT backend, see ocean_fft
+    n_samples : number of samples integrated simultaneously
+    """
+    def __init__(self, kx, ky, k_squared_no_zero, P, norm_factor, mu, F_hat, dt, fft,
+                 n_samples=1):
+
+        N = kx.shape[0]
+        self.shape_hat = (n_samples, N, int(N/2+1))
+        self.shape = (n_samples, N, N)
+        self.dt = dt
+        self.fft = fft
+        self.complex_dtype = kx.dtype
+        self.real_dtype = np.finfo(kx.dtype).dtype
+
+        self.kx = kx
+        self.ky = ky
+        self.minus_ky = -ky
+        self.k_squared_no_zero = k_squared_no_zero
+        self.P = P
+
+        #constant terms of the AB/BDI2 scheme
+        self.norm_factor_P = (norm_factor*P).astype(self.complex_dtype)
+        self.mu_F_hat = (mu*F_hat).astype(self.complex_dtype)
+
+        #state: vorticity at n-1, n, n+1 and the Jacobian at n-1, n
+        self.w_hat_nm1 = np.zeros(self.shape_hat, dtype=self.complex_dtype)
+        self.w_hat_n = np.zeros(self.shape_hat, dtype=self.complex_dtype)
+        self.w_hat_np1 = np.zeros(self.shape_hat, dtype=self.complex_dtype)
+        self.VgradW_hat_nm1 = np.zeros(self.shape_hat, dtype=self.complex_dtype)
+        self.VgradW_hat_n = np.zeros(self.shape_hat, dtype=self.complex_dtype)
+
+        #scratch arrays
+        self._psi_hat = np.zeros(self.shape_hat, dtype=self.complex_dtype)
+        self._work_hat = np.zeros(self.shape_hat, dtype=self.complex_dtype)
+        self._u = np.zeros(self.shape, dtype=self.real_dtype)
+        self._w_x = np.zeros(self.shape, dtype=self.real_dtype)
+        self._v = np.zeros(self.shape, dtype=self.real_dtype)
+        self._w_y = np.zeros(self.shape, dtype=self.real_dtype)
+
+    def set_state(self, w_hat_nm1, w_hat_n, VgradW_hat_nm1=None):
+        """
+        Copies the vorticity at time n-1 and n into the stepper. If the Jacobian at
+        n-1 is not given, it is computed from w_hat_nm1.
+        """
+        self.w_hat_nm1[...] = w_hat_nm1
+        self.w_hat_n[...] = w_hat_n
+        if VgradW_hat_nm1 is None:
+            self.compute_VgradW_hat(self.w_hat_nm1, self.VgradW_hat_nm1)
+        else:
+            self.VgradW_hat_nm1[...] = VgradW_hat_nm1
+
+    #pseudo-spectral technique to solve for Fourier coefs of Jacobian
+    def compute_VgradW_hat(self, w_hat_n, out):
+
+        psi_hat_n = self._psi_hat
+        work_hat = self._work_hat
+        u_n, w_x_n, v_n, w_y_n = self._u, self._w_x, self._v, self._w_y
+
+        #compute streamfunction
+        np.divide(w_hat_n, self.k_squared_no_zero, out=psi_hat_n)
+        psi_hat_n[..., 0, 0] = 0.0
+
+        #compute jacobian in physical space
+        self.fft.irfft2(np.multiply(self.minus_ky, psi_hat_n, out=work_hat), out=u_n)
+        self.fft.irfft2(np.multiply(self.kx, w_hat_n, out=work_hat), out=w_x_n)
+
+        self.fft.irfft2(np.multiply(self.kx, psi_hat_n, out=work_hat), out=v_n)
+        self.fft.irfft2(np.multiply(self.ky, w_hat_n, out=work_hat), out=w_y_n)
+
+        np.multiply(u_n, w_x_n, out=u_n)
+        np.multiply(v_n, w_y_n, out=v_n)
+        VgradW_n = np.add(u_n, v_n, out=u_n)
+
+        #return to spectral space
+        self.fft.rfft2(VgradW_n, out=out)
+        out *= self.P
+
+        return out
+
+    def step(self, sgs_hat=None):
+        """
+        Advances all samples one time step. Afterwards, w_hat_n and VgradW_hat_nm1
+        contain the newly computed vorticity and the Jacobian of the previous w_hat_n.
+        """
+        dt = self.dt
+        w_hat_np1 = self.w_hat_np1
+        work_hat = self._work_hat
+
+        #compute jacobian
+        self.compute_VgradW_hat(self.w_hat_n, self.VgradW_hat_n)
+
+        #solve for next time step according to AB/BDI2 scheme
+        np.multiply(2.0/dt, self.w_hat_n, out=w_hat_np1)
+        np.subtract(w_hat_np1, np.multiply(1.0/(2.0*dt), self.w_hat_nm1, out=work_hat),
+                    out=w_hat_np1)
+        np.subtract(w_hat_np1, np.multiply(2.0, self.VgradW_hat_n, out=work_hat),
+                    out=w_hat_np1)
+        np.add(w_hat_np1, self.VgradW_hat_nm1, out=w_hat_np1)
+        np.add(w_hat_np1, self.mu_F_hat, out=w_hat_np1)
+        if sgs_hat is not None:
+            np.subtract(w_hat_np1, sgs_hat, out=w_hat_np1)
+        np.multiply(self.norm_factor_P, w_hat_np1, out=w_hat_np1)
+
+        #rotate the time levels: n -> n-1, n+1 -> n, and reuse the n-1 array for n+1
+        self.w_hat_nm1, self.w_hat_n, self.w_hat_np1 = \
+            self.w_hat_n, self.w_hat_np1, self.w_hat_nm1
+        self.VgradW_hat_nm1, self.VgradW_hat_n = self.VgradW_hat_n, self.VgradW_hat_nm1
+
+        return self.w_hat_n
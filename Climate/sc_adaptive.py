@@ -0,0 +1,347 @@
+"""
+===============================================================================
+DIMENSION-ADAPTIVE SPARSE-GRID STOCHASTIC COLLOCATION
+-------------------------------------------------------------------------------
+Instead of drawing a full tensor grid of a fixed polynomial order up front, the
+AdaptiveSC driver starts with the single collocation point of level (1,...,1) and
+refines the sparse grid one multi-index l at a time (Gerstner & Griebel):
+    - the 1D rules are nested, level l of input k has the 2l - 1 points
+      F_k^-1(u_j), with u_j the first 2l - 1 points of the van der Corput sequence
+      (1/2, 1/4, 3/4, 1/8, 5/8, ...) and F_k the CDF of the input distribution.
+      The points of coarser levels are always reused, and the number of points
+      grows linearly, which keeps the Lagrange interpolation well-conditioned,
+    - every round, the admissible forward neighbours of the accepted multi-indices
+      are the candidates. Only the collocation points of the candidates which have
+      not been evaluated before are submitted, in one batch,
+    - the refinement indicator of a candidate l is the hierarchical surplus of the
+      first two moments, |Delta_l E[Q]| + |Delta_l E[Q^2]|, relative to the scale
+      of Q and maximised over the QoIs. The candidate(s) with the largest indicator
+      are accepted, and the indicators are also summed per input dimension,
+    - the SC surrogate of the accepted multi-indices is an sc_surrogate.SCSurrogate.
+The model is any function of an (n_points, d) array that returns a dict
+{qoi: values}, e.g. ocean_model (in-process) or a CampaignModel, which adds the
+new points to an EasyVVUQ campaign and executes only the new runs.
+===============================================================================
+"""
+
+import itertools
+import os
+import sys
+import numpy as np
+import chaospy as cp
+from sc_surrogate import SCSurrogate
+
+__license__ = "LGPL"
+
+HOME = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.insert(0, os.path.join(HOME, 'sc'))
+
+def van_der_corput(n):
+    """
+    The first n points of the base 2 van der Corput sequence in (0, 1).
+    """
+    u = np.zeros(n)
+    for i in range(n):
+        j, denominator = i + 1, 1.0
+        while j > 0:
+            denominator *= 2.0
+            j, remainder = divmod(j, 2)
+            u[i] += remainder/denominator
+    return u
+
+class AdaptiveSC:
+    """
+    Parameters
+    ----------
+    vary : dict {name: chaospy distribution} of the uncertain inputs
+    model : function of an (n_points, d) array of inputs, in the order of vary,
+            returning a dict {qoi: array with n_points rows}
+    qoi_cols : names of the QoIs, by default all keys returned by the model
+    max_level : the maximum level of a 1D rule
+    """
+    def __init__(self, vary, model, qoi_cols=None, max_level=8):
+
+        self.params = list(vary.keys())
+        self.dists = list(vary.values())
+        self.d = len(self.params)
+        self.model = model
+        self.qoi_cols = qoi_cols
+        self.max_level = max_level
+
+        #1D collocation points and quadrature weights per input and level
+        self.xi_1d = [{} for k in range(self.d)]
+        self.wi_1d = [{} for k in range(self.d)]
+
+        #all evaluated collocation points and the corresponding code samples
+        self.xi_d = np.zeros([0, self.d])
+        self.samples = None
+        self._index = {}
+
+        #accepted multi-indices, and the indicators of all computed multi-indices
+        self.l_norm = [(1,)*self.d]
+        self.indicators = {}
+        self.history = []
+
+        self._evaluate([self.l_norm[0]])
+
+    def _get_rule(self, k, level):
+
+        if level not in self.xi_1d[k]:
+            u = van_der_corput(2*level - 1)
+            nodes = np.asarray(self.dists[k].inv(u), dtype=float).flatten()
+
+            #weights E[l_j(X_k)] of the Lagrange polynomials, exact with n Gauss points
+            x_gauss, w_gauss = cp.generate_quadrature(nodes.size, self.dists[k], rule='gaussian')
+            x_gauss = x_gauss.flatten()
+            weights = np.zeros(nodes.size)
+            for j in range(nodes.size):
+                others = np.delete(nodes, j)
+                l_j = np.prod((x_gauss[:, np.newaxis] - others)/(nodes[j] - others), axis=1)
+                weights[j] = np.sum(w_gauss*l_j)
+
+            self.xi_1d[k][level] = nodes
+            self.wi_1d[k][level] = weights
+
+        return self.xi_1d[k][level], self.wi_1d[k][level]
+
+    def _key(self, point):
+        return tuple(np.round(point, 12))
+
+    def _evaluate(self, multi_indices):
+        """
+        Evaluates the model at all collocation points of the multi-indices which were
+        not evaluated before, in a single batch. Returns the number of new points.
+        """
+        new_points = []
+        for l in multi_indices:
+            nodes = [self._get_rule(k, l[k])[0] for k in range(self.d)]
+            for point in itertools.product(*nodes):
+                key = self._key(point)
+                if key not in self._index:
+                    self._index[key] = len(self._index)
+                    new_points.append(point)
+
+        if len(new_points) == 0:
+            return 0
+
+        new_points = np.array(new_points)
+        results = self.model(new_points)
+
+        if self.qoi_cols is None:
+            self.qoi_cols = list(results.keys())
+        if self.samples is None:
+            self.samples = {qoi: np.zeros([0] + list(np.shape(results[qoi])[1:]))
+                            for qoi in self.qoi_cols}
+
+        self.xi_d = np.concatenate([self.xi_d, new_points])
+        for qoi in self.qoi_cols:
+            self.samples[qoi] = np.concatenate([self.samples[qoi], np.asarray(results[qoi], dtype=float)])
+
+        return len(new_points)
+
+    def _tensor_moments(self, l, qoi):
+        # E[I_l Q] and E[I_l Q^2] of the tensor interpolant of multi-index l
+        rules = [self._get_rule(k, l[k]) for k in range(self.d)]
+        moments = 0.0
+        for idx in itertools.product(*[range(nodes.size) for nodes, _ in rules]):
+            point = [rules[k][0][idx[k]] for k in range(self.d)]
+            weight = np.prod([rules[k][1][idx[k]] for k in range(self.d)])
+            value = self.samples[qoi][self._index[self._key(point)]]
+            moments = moments + weight*np.array([value, value**2])
+        return moments
+
+    def _surplus(self, l, qoi):
+        # Delta_l of the first two moments, via the backward differences of the tensor moments
+        surplus = 0.0
+        for z in itertools.product([0, 1], repeat=self.d):
+            l_z = tuple(np.subtract(l, z))
+            if min(l_z) >= 1:
+                surplus = surplus + (-1)**sum(z)*self._tensor_moments(l_z, qoi)
+        return surplus
+
+    def get_indicator(self, l):
+        """
+        The refinement indicator of the (evaluated) multi-index l.
+        """
+        indicator = 0.0
+        for qoi in self.qoi_cols:
+            surplus = self._surplus(l, qoi)
+            scale = np.abs(self.samples[qoi]).max(axis=0) + 1e-300
+            indicator = max(indicator, np.max(np.abs(surplus[0])/scale + np.abs(surplus[1])/scale**2))
+        return indicator
+
+    def get_candidates(self):
+        """
+        The admissible forward neighbours of the accepted multi-indices.
+        """
+        accepted = set(self.l_norm)
+        candidates = set()
+        for l in self.l_norm:
+            for k in range(self.d):
+                l_k = tuple(np.add(l, np.eye(self.d, dtype=int)[k]))
+                if l_k in accepted or max(l_k) > self.max_level:
+                    continue
+                #all backward neighbours must have been accepted
+                if all(tuple(np.subtract(l_k, np.eye(self.d, dtype=int)[j])) in accepted
+                       for j in range(self.d) if l_k[j] > 1):
+                    candidates.add(tuple(int(i) for i in l_k))
+        return sorted(candidates)
+
+    def refine(self, n_accept=1):
+        """
+        One refinement round: evaluates the new points of all candidates and accepts
+        the n_accept candidates with the largest indicator. Returns the accepted
+        multi-indices and the summed indicators per input dimension.
+        """
+        candidates = self.get_candidates()
+        if len(candidates) == 0:
+            return [], np.zeros(self.d)
+
+        n_new = self._evaluate(candidates)
+
+        for l in candidates:
+            if l not in self.indicators:
+                self.indicators[l] = self.get_indicator(l)
+
+        accepted = sorted(candidates, key=lambda l: self.indicators[l], reverse=True)[0:n_accept]
+        self.l_norm.extend(accepted)
+
+        #per-dimension indicators: the candidates which refine dimension k
+        dim_indicators = np.zeros(self.d)
+        for l in candidates:
+            for k in range(self.d):
+                if l[k] > 1:
+                    dim_indicators[k] += self.indicators[l]
+
+        self.history.append({'accepted': accepted, 'n_new_points': n_new,
+                             'n_points': self.xi_d.shape[0],
+                             'dim_indicators': dim_indicators})
+
+        return accepted, dim_indicators
+
+    def run(self, max_rounds=10, max_points=None, tol=None, n_accept=1, verbose=True):
+        """
+        Refines until max_rounds rounds have been performed, more than max_points
+        collocation points have been evaluated, or the largest indicator of the
+        accepted multi-indices drops below tol.
+        """
+        for i in range(max_rounds):
+            accepted, dim_indicators = self.refine(n_accept)
+            if len(accepted) == 0:
+                break
+
+            max_indicator = self.indicators[accepted[0]]
+            if verbose:
+                print('Round', i + 1, ': accepted', accepted, ', indicator =', max_indicator,
+                      ', points =', self.xi_d.shape[0])
+                print('    indicators per dimension', dict(zip(self.params, dim_indicators.tolist())))
+
+            if tol is not None and max_indicator < tol:
+                break
+            if max_points is not None and self.xi_d.shape[0] >= max_points:
+                break
+
+    def get_moments(self, qoi):
+        """
+        The mean and standard deviation of qoi, from the combination of the tensor
+        moments of the accepted multi-indices.
+        """
+        coefficients = SCSurrogate.combination_coefficients(self.l_norm)
+        moments = sum(c_l*self._tensor_moments(l, qoi) for l, c_l in coefficients.items())
+        mean = moments[0]
+        return mean, np.sqrt(np.maximum(moments[1] - mean**2, 0.0))
+
+    def get_surrogate(self, chunk_size=100000):
+        """
+        The (vectorised) SC surrogate of the accepted multi-indices.
+        """
+        return SCSurrogate(self.xi_d, self.samples, l_norm=self.l_norm, xi_1d=self.xi_1d,
+                           chunk_size=chunk_size)
+
+def ocean_model(xi, **opts):
+    """
+    Integrates the ocean model at the (decay_time_nu, decay_time_mu) inputs xi,
+    all in a single batch in this process.
+    """
+    import ocean
+
+    samples = [{'decay_time_nu': x[0], 'decay_time_mu': x[1]} for x in xi]
+    qois = ocean.run_batch(samples, verbose=False, **opts)
+
+    return {qoi: np.array([q[qoi] for q in qois]) for qoi in ocean.QOI_COLS}
+
+class CampaignModel:
+    """
+    Model which adds the collocation points as runs to an EasyVVUQ campaign (after
+    set_app / add_app), and executes only the new run directories, by default with a
+    LocalOceanExecutor. All runs remain stored in the campaign.
+
+    Parameters
+    ----------
+    campaign : EasyVVUQ Campaign
+    params : names of the uncertain inputs, in the order of the columns of xi
+    executor : object with a run(runs) method returning {run_id: QoIs}
+    fixed_params : values of the other parameters of every run
+    """
+    def __init__(self, campaign, params, executor=None, fixed_params={'out_file': 'output.csv'}):
+
+        if executor is None:
+            from ocean_executor import LocalOceanExecutor
+            executor = LocalOceanExecutor()
+
+        self.campaign = campaign
+        self.params = params
+        self.executor = executor
+        self.fixed_params = fixed_params
+
+    def __call__(self, xi):
+
+        runs_before = set(dict(self.campaign.list_runs()).keys())
+
+        runs = []
+        for x in xi:
+            run = dict(self.fixed_params)
+            run.update(zip(self.params, [float(x_k) for x_k in x]))
+            runs.append(run)
+        self.campaign.add_runs(runs)
+        self.campaign.populate_runs_dir()
+
+        #the new runs, in the order in which they were added, i.e. the order of xi
+        new_runs = [(run_id, run_info) for run_id, run_info in dict(self.campaign.list_runs()).items()
+                    if run_id not in runs_before]
+        if len(new_runs) != len(runs):
+            raise RuntimeError('Added {} runs to the campaign, but found {} new runs'.format(
+                               len(runs), len(new_runs)))
+
+        results = self.executor.run(new_runs)
+
+        qois = []
+        for run, (run_id, run_info) in zip(runs, new_runs):
+            if any(float(run_info['params'][param]) != run[param] for param in self.params):
+                raise RuntimeError('The inputs of {} do not match collocation point {}'.format(
+                                   run_id, [run[param] for param in self.params]))
+            if run_id not in results:
+                raise RuntimeError('No result for {}'.format(run_id))
+            qois.append(results[run_id])
+
+        return {qoi: np.array([q[qoi] for q in qois]) for qoi in qois[0].keys()}
+
+if __name__ == "__main__":
+
+    #the uncertain inputs of fab_ocean_job_submission.py, integrated in this process
+    vary = {
+        "decay_time_nu": cp.Normal(5.0, 1.0),
+        "decay_time_mu": cp.Uniform(80.0, 90.0)
+    }
+
+    adaptive_sc = AdaptiveSC(vary, ocean_model)
+    adaptive_sc.run(max_rounds=int(sys.argv[1]) if len(sys.argv) > 1 else 4)
+
+    print('========================================================')
+    for qoi in adaptive_sc.qoi_cols:
+        mean, std = adaptive_sc.get_moments(qoi)
+        print('Mean', qoi, '=', mean, ', std =', std)
+    print('Accepted multi-indices', adaptive_sc.l_norm)
+    print('Code evaluations =', adaptive_sc.xi_d.shape[0])
+    print('========================================================')
@@ -0,0 +1,206 @@
+"""
+===============================================================================
+ON-DISK CACHE OF A STOCHASTIC COLLOCATION (SC) ANALYSIS
+-------------------------------------------------------------------------------
+Rebuilding the SCAnalysis of a campaign (Lagrange weights, expansion, Sobol
+indices) every time the post-processing script runs is wasteful when no new runs
+were collated. get_sc_analysis stores everything the post-processing needs in a
+compact HDF5 file:
+    - the statistical moments and Sobol indices of every QoI,
+    - the code samples of every QoI, and the collocation points (xi_d, and for a
+      sparse grid l_norm and xi_1d) of the sampler,
+    - the key of the run set: a SHA-1 hash of the run ids and QoI values of the
+      collation result.
+When the key of the current collation result matches, the analysis is loaded
+from the cache (lazily, i.e. a dataset is only read when it is first used), and
+SCAnalysis is not constructed at all. The cache is rebuilt as soon as new runs
+have been collated. The loaded CachedSCAnalysis can be used in place of both the
+SCAnalysis and the sampler in sc_surrogate.get_sc_surrogate.
+===============================================================================
+"""
+
+import hashlib
+import os
+import h5py
+import numpy as np
+
+__license__ = "LGPL"
+
+def get_run_set_key(data, qoi_cols):
+    """
+    The SHA-1 hash of the run ids and QoI values of a collation DataFrame.
+    """
+    sha1 = hashlib.sha1()
+    if 'run_id' in data:
+        sha1.update(' '.join(str(run_id) for run_id in data['run_id']).encode())
+    for qoi in qoi_cols:
+        sha1.update(qoi.encode())
+        sha1.update(np.ascontiguousarray(data[qoi].values, dtype=float).tobytes())
+    return sha1.hexdigest()
+
+def _sobol_name(key):
+    # e.g. the Sobol index of the inputs (0, 1) is stored as '0_1'
+    return '_'.join(str(i) for i in np.atleast_1d(key))
+
+def save_analysis(fname, key, results, samples, xi_d, l_norm=None, xi_1d=None):
+    """
+    Writes the results dict of an SC analysis, the code samples {qoi: list of values}
+    and the collocation points to the HDF5 file fname, with the run set key.
+    """
+    tmp_fname = fname + '.tmp{}'.format(os.getpid())
+
+    with h5py.File(tmp_fname, 'w') as h5f:
+        h5f.attrs['key'] = key
+        h5f.create_dataset('xi_d', data=np.asarray(xi_d, dtype=float))
+        if l_norm is not None:
+            h5f.create_dataset('l_norm', data=np.asarray(l_norm, dtype=int))
+            for k, rules in enumerate(xi_1d):
+                for level, nodes in rules.items():
+                    h5f.create_dataset('xi_1d/{}/{}'.format(k, level), data=np.asarray(nodes, dtype=float))
+
+        for qoi, values in samples.items():
+            h5f.create_dataset('samples/' + qoi, data=np.array([np.asarray(value, dtype=float).flatten()
+                                                                for value in values]))
+
+        for qoi, moments in results['statistical_moments'].items():
+            for name, value in moments.items():
+                h5f.create_dataset('statistical_moments/{}/{}'.format(qoi, name), data=value)
+
+        for qoi, sobols in results.get('sobols', {}).items():
+            for sobol_key, value in sobols.items():
+                h5f.create_dataset('sobols/{}/{}'.format(qoi, _sobol_name(sobol_key)), data=value)
+
+    os.replace(tmp_fname, fname)
+
+class _LazyGroup(dict):
+    # dict of the datasets of an HDF5 group, read on first access
+    def __init__(self, fname, path, convert_key=str):
+        with h5py.File(fname, 'r') as h5f:
+            super().__init__((convert_key(name), None) for name in h5f[path].keys())
+        self._fname = fname
+        self._path = path
+        self._names = {convert_key(name): name for name in self}
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if value is None:
+            with h5py.File(self._fname, 'r') as h5f:
+                node = h5f[self._path][self._names[key]]
+                value = node[()] if isinstance(node, h5py.Dataset) else \
+                        {name: node[name][()] for name in node.keys()}
+            self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+class CachedSCAnalysis:
+    """
+    An SC analysis loaded from the cache. Provides the results dict, the code samples
+    and the collocation points, all read lazily from file.
+    """
+    def __init__(self, fname):
+
+        self.fname = fname
+        with h5py.File(fname, 'r') as h5f:
+            self.key = h5f.attrs['key']
+            self.qoi_cols = list(h5f['samples'].keys())
+            self.sparse = 'l_norm' in h5f
+        self._results = None
+        self._samples = None
+        self._xi_d = None
+
+    @property
+    def results(self):
+        if self._results is None:
+            results = {'statistical_moments': _LazyGroup(self.fname, 'statistical_moments')}
+            with h5py.File(self.fname, 'r') as h5f:
+                has_sobols = 'sobols' in h5f
+            if has_sobols:
+                sobols = _LazyGroup(self.fname, 'sobols')
+                #the Sobol indices are keyed by tuples of input indices, as in SCAnalysis
+                results['sobols'] = {qoi: {tuple(int(i) for i in name.split('_')): value
+                                           for name, value in sobols[qoi].items()}
+                                     for qoi in sobols.keys()}
+            self._results = results
+        return self._results
+
+    @property
+    def samples(self):
+        if self._samples is None:
+            self._samples = _LazyGroup(self.fname, 'samples')
+        return self._samples
+
+    @property
+    def _number_of_samples(self):
+        return self.xi_d.shape[0]
+
+    @property
+    def xi_d(self):
+        if self._xi_d is None:
+            with h5py.File(self.fname, 'r') as h5f:
+                self._xi_d = h5f['xi_d'][()]
+        return self._xi_d
+
+    @property
+    def l_norm(self):
+        with h5py.File(self.fname, 'r') as h5f:
+            return h5f['l_norm'][()]
+
+    @property
+    def xi_1d(self):
+        with h5py.File(self.fname, 'r') as h5f:
+            return [{int(level): h5f['xi_1d'][k][level][()] for level in h5f['xi_1d'][k].keys()}
+                    for k in sorted(h5f['xi_1d'].keys(), key=int)]
+
+def load_analysis(fname, key=None):
+    """
+    A CachedSCAnalysis of fname, or None if the file does not exist or belongs to
+    another run set than key.
+    """
+    if not os.path.isfile(fname):
+        return None
+
+    cached = CachedSCAnalysis(fname)
+    if key is not None and cached.key != key:
+        return None
+
+    return cached
+
+def get_sc_analysis(my_campaign, my_sampler, output_columns, cache_file=None):
+    """
+    The results dict and the (cached) SC analysis of the collated runs of my_campaign.
+    The analysis is recomputed with EasyVVUQ only when the run set has changed since
+    it was cached in cache_file (by default sc_analysis_cache.hdf5 in the campaign
+    directory).
+    """
+    import easyvvuq as uq
+
+    if cache_file is None:
+        cache_file = os.path.join(my_campaign.campaign_dir, 'sc_analysis_cache.hdf5')
+
+    key = get_run_set_key(my_campaign.get_collation_result(), output_columns)
+
+    cached = load_analysis(cache_file, key)
+    if cached is not None:
+        print('Loaded SC analysis from', cache_file)
+        return cached.results, cached
+
+    sc_analysis = uq.analysis.SCAnalysis(sampler=my_sampler, qoi_cols=output_columns)
+    my_campaign.apply_analysis(sc_analysis)
+    results = my_campaign.get_last_analysis()
+
+    sparse = getattr(my_sampler, 'sparse', False)
+    save_analysis(cache_file, key, results,
+                  {qoi: sc_analysis.samples[qoi] for qoi in output_columns}, my_sampler.xi_d,
+                  l_norm=my_sampler.l_norm if sparse else None,
+                  xi_1d=my_sampler.xi_1d if sparse else None)
+    print('Stored SC analysis in', cache_file)
+
+    return results, sc_analysis
@@ -0,0 +1,191 @@
+"""
+===============================================================================
+BATCHED EVALUATION OF A STOCHASTIC COLLOCATION (SC) SURROGATE
+-------------------------------------------------------------------------------
+SCAnalysis.surrogate evaluates the SC expansion at a single input vector. The
+SCSurrogate below evaluates the same Lagrange interpolant at an (n_mc, d) array
+of inputs at once, for all QoIs:
+    - the Lagrange basis weights 1/prod_{m!=j}(x_j - x_m) of the 1D collocation
+      points are precomputed per dimension,
+    - for a tensor grid, the code samples are stored as a tensor of shape
+      (n_1, ..., n_d, n_out), which is contracted one dimension at a time with
+      the (n_mc, n_k) matrix of 1D Lagrange polynomials,
+    - for a sparse grid, the interpolant is the combination of tensor
+      interpolants on the sub grids of the multi-indices l, with combination
+      coefficients c_l = sum_{z in {0,1}^d, l+z in Lambda} (-1)^|z|,
+    - the inputs are processed in chunks of chunk_size rows, to bound the memory
+      use for 10^6 - 10^7 Monte Carlo samples.
+===============================================================================
+"""
+
+import itertools
+import numpy as np
+
+__license__ = "LGPL"
+
+class LagrangeBasis1D:
+    """
+    The Lagrange polynomials of a set of 1D collocation points.
+    """
+    def __init__(self, nodes):
+
+        self.nodes = np.asarray(nodes, dtype=float)
+        n = self.nodes.size
+
+        diff = self.nodes.reshape([n, 1]) - self.nodes.reshape([1, n])
+        np.fill_diagonal(diff, 1.0)
+        #precomputed weights 1/prod_{m!=j}(x_j - x_m)
+        self.weights = 1.0/np.prod(diff, axis=1)
+
+    def __call__(self, x):
+        """
+        The n_nodes Lagrange polynomials evaluated at x, shape (len(x), n_nodes).
+        """
+        n = self.nodes.size
+        if n == 1:
+            return np.ones([x.size, 1])
+
+        diff = x.reshape([-1, 1]) - self.nodes.reshape([1, -1])
+        #prod_{m!=j}(x - x_m), by setting the j-th factor of the j-th polynomial to one
+        factors = np.repeat(diff[:, np.newaxis, :], n, axis=1)
+        factors[:, np.arange(n), np.arange(n)] = 1.0
+
+        return np.prod(factors, axis=2)*self.weights
+
+class TensorInterpolant:
+    """
+    Lagrange interpolant on a tensor grid of 1D collocation points.
+
+    Parameters
+    ----------
+    nodes_1d : list of d arrays with the 1D collocation points
+    values : code samples at the grid points, shape (n_1, ..., n_d, n_out)
+    """
+    def __init__(self, nodes_1d, values):
+        self.bases = [LagrangeBasis1D(nodes) for nodes in nodes_1d]
+        self.values = values
+
+    def __call__(self, xi):
+
+        n_mc = xi.shape[0]
+
+        #contract the leading dimension of the value tensor with the Lagrange polynomials
+        #of the first input, then the next dimension per sample, and so on
+        result = self.bases[0](xi[:, 0]) @ self.values.reshape([self.values.shape[0], -1])
+        for k, basis in enumerate(self.bases[1:], start=1):
+            result = np.einsum('cj,cjr->cr', basis(xi[:, k]),
+                               result.reshape([n_mc, basis.nodes.size, -1]))
+
+        return result
+
+class SCSurrogate:
+    """
+    Vectorised SC surrogate for a tensor or sparse collocation grid.
+
+    Parameters
+    ----------
+    xi_d : collocation points, shape (n_samples, d)
+    samples : dict {qoi: code samples}, with one scalar or array per collocation point,
+              in the order of xi_d
+    l_norm : multi-indices of a sparse grid, shape (n_l, d), or None for a tensor grid
+    xi_1d : for a sparse grid, xi_1d[k][l] are the 1D points of level l of dimension k
+    chunk_size : number of input vectors evaluated at once
+    """
+    def __init__(self, xi_d, samples, l_norm=None, xi_1d=None, chunk_size=100000):
+
+        self.xi_d = np.asarray(xi_d, dtype=float)
+        self.d = self.xi_d.shape[1]
+        self.chunk_size = chunk_size
+
+        #all QoIs are interpolated simultaneously, as columns of a single (n_samples, n_out) array
+        self.qoi_cols = list(samples.keys())
+        self.qoi_sizes = []
+        columns = []
+        for qoi in self.qoi_cols:
+            values = np.array([np.asarray(value, dtype=float).flatten() for value in samples[qoi]])
+            self.qoi_sizes.append(values.shape[1])
+            columns.append(values)
+        self.values = np.concatenate(columns, axis=1)
+
+        if l_norm is None:
+            nodes_1d = [np.unique(self.xi_d[:, k]) for k in range(self.d)]
+            self.interpolants = [(1.0, self._get_interpolant(nodes_1d))]
+        else:
+            self.interpolants = []
+            for l, c_l in self.combination_coefficients(l_norm).items():
+                nodes_1d = [np.asarray(xi_1d[k][l[k]], dtype=float) for k in range(self.d)]
+                self.interpolants.append((c_l, self._get_interpolant(nodes_1d)))
+
+    @staticmethod
+    def combination_coefficients(l_norm):
+        """
+        The non-zero coefficients of the sparse grid combination technique.
+        """
+        Lambda = set(tuple(int(l_k) for l_k in l) for l in np.asarray(l_norm))
+        d = len(next(iter(Lambda)))
+
+        coefficients = {}
+        for l in Lambda:
+            c_l = 0
+            for z in itertools.product([0, 1], repeat=d):
+                if tuple(np.add(l, z)) in Lambda:
+                    c_l += (-1)**sum(z)
+            if c_l != 0:
+                coefficients[l] = c_l
+
+        return coefficients
+
+    def _get_interpolant(self, nodes_1d):
+
+        #find the code samples of all points of the tensor grid of nodes_1d
+        grid = np.array(list(itertools.product(*nodes_1d)))
+        distance = np.abs(grid[:, np.newaxis, :] - self.xi_d[np.newaxis, :, :]).max(axis=2)
+        idx = np.argmin(distance, axis=1)
+        scale = np.abs(self.xi_d).max(axis=0)
+        if not np.allclose(grid, self.xi_d[idx], rtol=1e-10, atol=1e-12*np.max(scale)):
+            raise ValueError("The collocation grid does not contain all points of the tensor grid")
+
+        values = self.values[idx].reshape([nodes.size for nodes in nodes_1d] + [-1])
+        return TensorInterpolant(nodes_1d, values)
+
+    def __call__(self, xi, qoi=None):
+        """
+        Evaluates the surrogate at the input vectors xi, shape (n_mc, d). Returns
+        a dict {qoi: array of shape (n_mc,) or (n_mc, n_out)}, or only the array of
+        the given qoi.
+        """
+        xi = np.asarray(xi, dtype=float).reshape([-1, self.d])
+        n_mc = xi.shape[0]
+
+        result = np.zeros([n_mc, self.values.shape[1]])
+        for start in range(0, n_mc, self.chunk_size):
+            chunk = slice(start, min(start + self.chunk_size, n_mc))
+            for c_l, interpolant in self.interpolants:
+                result[chunk] += c_l*interpolant(xi[chunk])
+
+        #split the columns per QoI
+        surrogate = {}
+        offset = 0
+        for name, size in zip(self.qoi_cols, self.qoi_sizes):
+            values = result[:, offset:offset + size]
+            surrogate[name] = values[:, 0] if size == 1 else values
+            offset += size
+
+        if qoi is not None:
+            return surrogate[qoi]
+        return surrogate
+
+def get_sc_surrogate(sc_analysis, sampler, qoi_cols=None, chunk_size=100000):
+    """
+    An SCSurrogate of the QoIs (by default all qoi_cols) of an EasyVVUQ SCAnalysis.
+    """
+    if qoi_cols is None:
+        qoi_cols = sc_analysis.qoi_cols
+
+    samples = {qoi: sc_analysis.samples[qoi] for qoi in qoi_cols}
+
+    if getattr(sampler, 'sparse', False):
+        return SCSurrogate(sampler.xi_d, samples, l_norm=sampler.l_norm, xi_1d=sampler.xi_1d,
+                           chunk_size=chunk_size)
+
+    return SCSurrogate(sampler.xi_d, samples, chunk_size=chunk_size)
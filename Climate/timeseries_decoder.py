@@ -0,0 +1,85 @@
+# EasyVVUQ decoder for the time series of the diagnostics of the 2D ocean model
+#
+# ocean.py streams the energy E and enstrophy Z to an HDF5 file per run, with
+# one dataset per column ('t' in days, 'E' and 'Z'), if the 'timeseries_file'
+# option is set, see sc/ocean_output.py. This decoder reads only the requested
+# columns, and optionally only a time window [t_start, t_end].
+
+import os
+import logging
+import h5py
+import numpy as np
+import pandas as pd
+from easyvvuq import OutputType
+from easyvvuq.decoders.base import BaseDecoder
+
+__license__ = "LGPL"
+
+class TimeSeriesDecoder(BaseDecoder, decoder_name="timeseries_decoder"):
+
+    def __init__(self, target_filename, output_columns, t_start=None, t_end=None):
+
+        if target_filename is None:
+            msg = (f"target_filename must be set for TimeSeriesDecoder. This should be"
+                   f"the name of the output file this decoder acts on.")
+            logging.error(msg)
+            raise Exception(msg)
+
+        if output_columns is None or len(output_columns) == 0:
+            msg = (f"output_columns must be specified for TimeSeriesDecoder.")
+            logging.error(msg)
+            raise Exception(msg)
+
+        self.target_filename = target_filename
+        self.output_columns = output_columns
+        self.t_start = t_start
+        self.t_end = t_end
+
+        self.output_type = OutputType('sample')
+
+    @staticmethod
+    def _get_output_path(run_info=None, outfile=None):
+
+        run_path = run_info['run_dir']
+
+        if not os.path.isdir(run_path):
+            raise RuntimeError(f"Run directory does not exist: {run_path}")
+
+        return os.path.join(run_path, outfile)
+
+    def sim_complete(self, run_info=None):
+
+        out_path = self._get_output_path(run_info, self.target_filename)
+
+        return os.path.isfile(out_path)
+
+    def _get_window(self, h5f):
+
+        # Indices of the time window, only the 't' column is read to find them
+        if self.t_start is None and self.t_end is None:
+            return 0, h5f['t'].shape[0]
+
+        t = h5f['t'][()]
+        i_start = 0 if self.t_start is None else np.searchsorted(t, self.t_start, side='left')
+        i_end = t.size if self.t_end is None else np.searchsorted(t, self.t_end, side='right')
+
+        return i_start, i_end
+
+    def parse_sim_output(self, run_info={}):
+
+        out_path = self._get_output_path(run_info, self.target_filename)
+
+        with h5py.File(out_path, 'r') as h5f:
+            i_start, i_end = self._get_window(h5f)
+            data = {qoi: h5f[qoi][i_start:i_end] for qoi in self.output_columns}
+
+        return pd.DataFrame(data)
+
+    def get_restart_dict(self):
+        return {"target_filename": self.target_filename,
+                "output_columns": self.output_columns,
+                "t_start": self.t_start,
+                "t_end": self.t_end}
+
+    def element_version(self):
+        return "0.1"
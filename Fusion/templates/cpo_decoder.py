@@ -6,13 +6,28 @@ import pandas as pd
 from easyvvuq import OutputType
 from easyvvuq.decoders.base import BaseDecoder
 from ascii_cpo import read, write
-from utils import statistics
+from utils import statistics, cpo_tools
+
+
+# Fields of the ASCII CPO file (and column, for ion species) of the QoIs that can be
+# read without building the CPO object, see cpo_tools.read_fields
+QOI_FIELDS = {
+    "coreprof": {
+        "Te": ("te%value", None),
+        "Ti": ("ti%value", 0),
+    }
+}
+
+
+# The QoI values of runs decoded in advance (e.g. by utils.collation.collate_profiles),
+# keyed by the absolute path of the output file. Used once by parse_sim_output.
+_decoded = {}
 
 
 # Specific Decoder for CPO files
 class CPODecoder(BaseDecoder, decoder_name="cpo_decoder"):
 
-    def __init__(self, target_filename, cpo_name, output_columns):
+    def __init__(self, target_filename, cpo_name, output_columns, streaming=True):
 
         if target_filename is None:
             msg = (f"target_filename must be set for CPODecoder. This should be"
@@ -38,28 +53,51 @@ class CPODecoder(BaseDecoder, decoder_name="cpo_decoder"):
         self.target_filename = target_filename
         self.cpo_name = cpo_name
         self.output_columns = output_columns
+        self.streaming = streaming
 
         self.output_type = OutputType('sample')
 
     @staticmethod
     def _get_qoi_values(cpo_core):
-        # Map Quantities of Interert values
+        # Map Quantities of Interert values, evaluated only when called
         if cpo_core.base_path == 'coreprof':
             switcher_dict = {
-                "Te": cpo_core.te.value,
-                "Ti": cpo_core.ti.value[:,0],
+                "Te": lambda: cpo_core.te.value,
+                "Ti": lambda: cpo_core.ti.value[:,0],
             }
 
         if cpo_core.base_path == 'coretransp':
             switcher_dict = {
-                "Te_transp_D": cpo_core.values[0].te_transp.diff_eff,
-                "Ti_transp_D": cpo_core.values[0].ti_transp.diff_eff[0],
-                "Te_transp_flux": cpo_core.values[0].te_transp.flux,
-                "Ti_transp_flux": cpo_core.values[0].ti_transp.flux[:,0]
+                "Te_transp_D": lambda: cpo_core.values[0].te_transp.diff_eff,
+                "Ti_transp_D": lambda: cpo_core.values[0].ti_transp.diff_eff[0],
+                "Te_transp_flux": lambda: cpo_core.values[0].te_transp.flux,
+                "Ti_transp_flux": lambda: cpo_core.values[0].ti_transp.flux[:,0]
             }	#OL: change Ti_transp_flux to include another index
 
         return switcher_dict
 
+    # Read the QoIs from the CPO file without building the CPO object.
+    # Returns None if not all QoIs can be read this way.
+    def _read_qoi_values(self, out_path):
+        qoi_fields = QOI_FIELDS.get(self.cpo_name, {})
+        if any(qoi not in qoi_fields for qoi in self.output_columns):
+            return None
+
+        fields = list(set(qoi_fields[qoi][0] for qoi in self.output_columns))
+        try:
+            values = cpo_tools.read_fields(out_path, self.cpo_name, fields)
+        except (ValueError, StopIteration) as e:
+            logging.warning(f"Streaming read of {out_path} failed ({e}), using ascii_cpo.read.")
+            return None
+
+        quoi_dict = {}
+        for qoi in self.output_columns:
+            field, column = qoi_fields[qoi]
+            value = values[field]
+            quoi_dict.update({qoi: value if column is None else value[:, column]})
+
+        return quoi_dict
+
     @staticmethod
     def _get_output_path(run_info=None, outfile=None):
 
@@ -79,18 +117,52 @@ class CPODecoder(BaseDecoder, decoder_name="cpo_decoder"):
         else:
             return True
 
-    def parse_sim_output(self, run_info={}):
+    # Returns dict of the QoI values (arrays) of a run
+    def get_qoi_values(self, run_info={}):
 
         out_path = self._get_output_path(run_info, self.target_filename)
 
-        # The CPO object
-        cpo_core = read(out_path, self.cpo_name)
+        # Get Quantity of Intersets, only the required fields are read
+        quoi_dict = self._read_qoi_values(out_path) if self.streaming else None
 
-        # Get Quantity of Intersets
-        qoi_values = self._get_qoi_values(cpo_core)
-        quoi_dict = {}
-        for qoi in self.output_columns:
-            quoi_dict.update({qoi: qoi_values[qoi]})
+        if quoi_dict is None:
+            # The CPO object
+            cpo_core = read(out_path, self.cpo_name)
+
+            qoi_values = self._get_qoi_values(cpo_core)
+            quoi_dict = {}
+            for qoi in self.output_columns:
+                quoi_dict.update({qoi: qoi_values[qoi]()})
+
+        return quoi_dict
+
+    # Returns the radial grid (rho_tor_norm) of the output of a run
+    def get_rho(self, run_info={}):
+
+        out_path = self._get_output_path(run_info, self.target_filename)
+
+        if self.streaming:
+            try:
+                return cpo_tools.read_fields(out_path, self.cpo_name, ["rho_tor_norm"])["rho_tor_norm"]
+            except (ValueError, StopIteration):
+                pass
+
+        return read(out_path, self.cpo_name).rho_tor_norm
+
+    # Store the QoI values of a run decoded in advance, used by parse_sim_output
+    def cache_qoi_values(self, run_info, quoi_dict):
+
+        out_path = self._get_output_path(run_info, self.target_filename)
+        _decoded[os.path.abspath(out_path)] = quoi_dict
+
+    def parse_sim_output(self, run_info={}):
+
+        out_path = self._get_output_path(run_info, self.target_filename)
+
+        # The values decoded in advance, or otherwise read from the output file
+        quoi_dict = _decoded.pop(os.path.abspath(out_path), None)
+        if quoi_dict is None:
+            quoi_dict = self.get_qoi_values(run_info)
 
         # Output data frame
         data = pd.DataFrame(quoi_dict)
@@ -100,7 +172,8 @@ class CPODecoder(BaseDecoder, decoder_name="cpo_decoder"):
     def get_restart_dict(self):
         return {"target_filename": self.target_filename,
                 "cpo_name": self.cpo_name,
-                "output_columns": self.output_columns}
+                "output_columns": self.output_columns,
+                "streaming": self.streaming}
 
     def element_version(self):
         return "0.1"
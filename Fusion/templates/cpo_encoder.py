@@ -6,7 +6,8 @@ import pandas as pd
 from easyvvuq import OutputType
 from easyvvuq.encoders.base import BaseEncoder
 from ascii_cpo import read, write
-from utils import statistics, cpo_tools
+from utils import statistics, cpo_tools, staging
+from utils.cpo_patch import CPOPatchWriter, get_changed_slots
 
 
 # Specific Encoder for CPO files
@@ -15,7 +16,7 @@ class CPOEncoder(BaseEncoder, encoder_name="cpo_encoder"):
     def __init__(self,
                  template_filename, target_filename,
                  common_dir, uncertain_params, cpo_name,
-                 flux_indices=None, link_xmlfiles=False):
+                 flux_indices=None, link_xmlfiles=False, patch_writer=True):
 
         # Check that user has specified the objests to use as template
         if template_filename is None:
@@ -30,10 +31,11 @@ class CPOEncoder(BaseEncoder, encoder_name="cpo_encoder"):
         self.cpo_name = cpo_name
         self.link_xmlfiles = link_xmlfiles
         self.flux_indices = flux_indices
+        self.patch_writer = patch_writer
 
         self.fixture_support = True
 
-        # The CPO object
+        # The CPO object, used as a read-only template
         cpo_filename = os.path.join(common_dir, template_filename)
         self.cpo_core = read(cpo_filename, cpo_name)
 
@@ -49,6 +51,9 @@ class CPOEncoder(BaseEncoder, encoder_name="cpo_encoder"):
 #            "Ti_grad_2" : self.cpo_core.ti.ddrho[self.flux_indices[1]][0]
         }
 
+        # Writes the CPO file of a run by splicing its values into the template
+        self._writer = self._get_patch_writer() if patch_writer else None
+
     @staticmethod
     def _set_params_value(cpo_core, param, value, flux_indices):
         # TODO
@@ -76,6 +81,40 @@ class CPOEncoder(BaseEncoder, encoder_name="cpo_encoder"):
         if param=="Ti_grad_2":
             cpo_core.ti.ddrho[flux_indices[1]][0] = value
 
+    # Set the sample values of the uncertain params in cpo_core
+    def _apply_params(self, cpo_core, params):
+        for k in self.uncertain_params.keys():
+            v = params[k]
+            self._set_params_value(cpo_core, k, v, self.flux_indices)
+
+            # Udpate Electron and Ion Temperature around flux tube according to the sample Gradient
+            if k == "Te_grad_1":
+                cpo_tools.update_te_grad(cpo_core, v, self.flux_indices[0])
+            if k == "Ti_grad_1":
+                cpo_tools.update_ti_grad(cpo_core, v, self.flux_indices[0])
+            if k == "Te_grad_2":
+                cpo_tools.update_te_grad(cpo_core, v, self.flux_indices[1])
+            if k == "Ti_grad_2":
+                cpo_tools.update_ti_grad(cpo_core, v, self.flux_indices[1])
+
+    # Writer splicing the sample values into the serialized template, or None
+    def _get_patch_writer(self):
+        # The values changed by the uncertain params, found by applying two
+        # different sets of probe values to copies of the template
+        slots = set()
+        for probe in [1.5, 2.5]:
+            params = {k: probe*abs(self.mapper.get(k, 1.)) + 1.
+                      for k in self.uncertain_params.keys()}
+            cpo_core = cpo_tools.copy_profiles(self.cpo_core)
+            self._apply_params(cpo_core, params)
+            slots.update(get_changed_slots(self.cpo_core, cpo_core, cpo_tools.PROFILE_PATHS))
+
+        try:
+            return CPOPatchWriter(self.cpo_core, sorted(slots))
+        except RuntimeError as e:
+            logging.warning(str(e) + " Using ascii_cpo.write instead.")
+            return None
+
     # Returns dict (params) for Campaign and a list (vary) of distribitions for Sampler
     def draw_app_params(self):
         params = {}
@@ -108,31 +147,25 @@ class CPOEncoder(BaseEncoder, encoder_name="cpo_encoder"):
         if not target_dir:
             raise RuntimeError('No target directory specified to encoder')
 
-        for k in self.uncertain_params.keys():
-            v = local_params[k]
-            self._set_params_value(self.cpo_core, k, v, self.flux_indices)
-
-            # Udpate Electron and Ion Temperature around flux tube according to the sample Gradient
-            if k == "Te_grad_1":
-                cpo_tools.update_te_grad(self.cpo_core, v, self.flux_indices[0])
-            if k == "Ti_grad_1":
-                cpo_tools.update_ti_grad(self.cpo_core, v, self.flux_indices[0])
-            if k == "Te_grad_2":
-                cpo_tools.update_te_grad(self.cpo_core, v, self.flux_indices[1])
-            if k == "Ti_grad_2":
-                cpo_tools.update_ti_grad(self.cpo_core, v, self.flux_indices[1])
+        # The template is never modified: the sample values are set in a copy of
+        # its profiles, such that encode can be called concurrently
+        cpo_core = cpo_tools.copy_profiles(self.cpo_core)
+        self._apply_params(cpo_core, local_params)
 
         # Do a symbolic link to other CPO and XML files
-        os.system("ln -s " + self.common_dir + "*.cpo " + target_dir)
+        patterns = ["*.cpo"]
         if self.link_xmlfiles:
-            os.system("ln -s " + self.common_dir + "*.xml " + target_dir)
-            os.system("ln -s " + self.common_dir + "*.xsd " + target_dir)
+            patterns += ["*.xml", "*.xsd"]
+        staging.link_files(self.common_dir, target_dir, patterns, exclude=[self.target_filename])
+
         # Write target input CPO file
         target_file_path = os.path.join(target_dir, self.target_filename)
-        if(os.path.isfile(target_file_path)):
-            os.system("rm -rf " + target_file_path)
+        staging.remove_file(target_file_path)
 
-        write(self.cpo_core, target_file_path)
+        if self._writer is not None:
+            self._writer.write(cpo_core, target_file_path)
+        else:
+            write(cpo_core, target_file_path)
 
     def get_restart_dict(self):
         return {"template_filename": self.template_filename,
@@ -141,7 +174,8 @@ class CPOEncoder(BaseEncoder, encoder_name="cpo_encoder"):
                 "uncertain_params": self.uncertain_params,
                 "cpo_name": self.cpo_name,
                 "link_xmlfiles": self.link_xmlfiles,
-                "flux_indices": self.flux_indices}
+                "flux_indices": self.flux_indices,
+                "patch_writer": self.patch_writer}
 
     def element_version(self):
         return "0.1"
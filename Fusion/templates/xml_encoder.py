@@ -1,19 +1,22 @@
 # -*- coding: UTF-8 -*-
 import os
+import io
+import copy
 import logging
 import chaospy as cp
 import pandas as pd
 import xml.etree.ElementTree as et
+from xml.sax.saxutils import escape
 from easyvvuq import OutputType
 from easyvvuq.encoders.base import BaseEncoder
-from utils import statistics
+from utils import statistics, staging
 
 
 # Specific Encoder
 class XMLEncoder(BaseEncoder, encoder_name="xml_encoder"):
 
     def __init__(self, template_filename, target_filename,
-                 common_dir, uncertain_params, link_cpofiles=False):
+                 common_dir, uncertain_params, link_cpofiles=False, text_splicing=True):
 
         # Check that user has specified the objests to use as template
         if template_filename is None:
@@ -26,6 +29,7 @@ class XMLEncoder(BaseEncoder, encoder_name="xml_encoder"):
         self.common_dir = common_dir
         self.uncertain_params = uncertain_params
         self.link_cpofiles = link_cpofiles
+        self.text_splicing = text_splicing
 
         self.fixture_support = True
 
@@ -45,17 +49,52 @@ class XMLEncoder(BaseEncoder, encoder_name="xml_encoder"):
             "width_ion"     : "./ions/heating/FWHEAT"
         }
 
+        # The elements of the uncertain params, resolved once
+        root = self.tree.getroot()
+        self.elements = {k: root.find(self.mapper[k]) for k in self.uncertain_params.keys()}
+
+        # The serialized template, split at the values of the uncertain params
+        self._segments = self._get_segments() if text_splicing else None
+
+    # Serialize the template once, with a unique marker as text of every uncertain param,
+    # and split it at the markers. Returns the list of (text before, param) and the rest,
+    # or None if the markers cannot be located.
+    def _get_segments(self):
+        tree = copy.deepcopy(self.tree)
+        root = tree.getroot()
+        markers = {}
+        for i, k in enumerate(self.uncertain_params.keys()):
+            markers[k] = "XMLEncoderValue%dX" % i
+            root.find(self.mapper[k]).text = markers[k]
+
+        buffer = io.BytesIO()
+        tree.write(buffer)
+        text = buffer.getvalue().decode("us-ascii")
+
+        positions = {}
+        for k, marker in markers.items():
+            if text.count(marker) != 1:
+                logging.warning("XMLEncoder: cannot locate " + k + " in the template, using tree.write instead.")
+                return None
+            positions[k] = text.index(marker)
+
+        segments = []
+        pos = 0
+        for k in sorted(positions, key=positions.get):
+            segments.append((text[pos:positions[k]], k))
+            pos = positions[k] + len(markers[k])
+
+        return segments, text[pos:]
+
     # Return param dict for Campagn and list of distribitions for Sampler
     def draw_app_params(self):
 
         params = {}
         vary = {}
-        root = self.tree.getroot()
 
         for k, d in self.uncertain_params.items():
             # Get initial values
-            elem = root.find(self.mapper[k])
-            val = float(elem.text)
+            val = float(self.elements[k].text)
             typ = d["type"]
             dist_name = d["distribution"]
             margin_error = d["margin_error"]
@@ -72,7 +111,6 @@ class XMLEncoder(BaseEncoder, encoder_name="xml_encoder"):
     # Creates simulation input files
     def encode(self, params={}, target_dir='', fixtures=None):
 
-        root = self.tree.getroot()
         if fixtures is not None:
             local_params = self.substitute_fixtures_params(params, fixtures, target_dir)
         else:
@@ -81,30 +119,41 @@ class XMLEncoder(BaseEncoder, encoder_name="xml_encoder"):
         if not target_dir:
             raise RuntimeError('No target directory specified to encoder')
 
-        for k in self.uncertain_params.keys():
-            v = local_params[k]
-            elem = root.find(self.mapper[k])
-            elem.text = str(v)
-
         # Do a symbolic link to other CPO and XML files
-        os.system("ln -s " + self.common_dir + "*.xml " + target_dir)
-        os.system("ln -s " + self.common_dir + "*.xsd " + target_dir)
+        patterns = ["*.xml", "*.xsd"]
         if self.link_cpofiles:
-            os.system("ln -s " + self.common_dir + "*.cpo " + target_dir)
+            patterns += ["*.cpo"]
+        staging.link_files(self.common_dir, target_dir, patterns, exclude=[self.target_filename])
 
         # Write target input (XML file)
         target_file_path = os.path.join(target_dir, self.target_filename)
-        if(os.path.isfile(target_file_path)):
-            os.system("rm -rf " + target_file_path)
+        staging.remove_file(target_file_path)
+
+        if self._segments is not None:
+            # Splice the values into the serialized template, the tree is not modified
+            # such that encode can be called concurrently
+            segments, tail = self._segments
+            chunks = []
+            for text, k in segments:
+                chunks.append(text)
+                chunks.append(escape(str(local_params[k])))
+            chunks.append(tail)
+
+            with open(target_file_path, "wb") as f:
+                f.write("".join(chunks).encode("us-ascii", "xmlcharrefreplace"))
+        else:
+            for k in self.uncertain_params.keys():
+                self.elements[k].text = str(local_params[k])
 
-        self.tree.write(target_file_path)
+            self.tree.write(target_file_path)
 
     def get_restart_dict(self):
         return {"template_filename": self.template_filename,
                 "target_filename": self.target_filename,
                 "common_dir": self.common_dir,
                 "uncertain_params": self.uncertain_params,
-                "link_cpofiles": self.link_cpofiles}
+                "link_cpofiles": self.link_cpofiles,
+                "text_splicing": self.text_splicing}
 
     def element_version(self):
         return "0.1"
@@ -6,6 +6,8 @@ from ascii_cpo import read
 from templates.xml_encoder import XMLEncoder
 from templates.cpo_encoder import CPOEncoder
 from templates.cpo_decoder import CPODecoder
+from utils.staging import copy_files
+from utils.collation import collate_profiles
 
 
 # Perform UQ for a fusion workflow using Non intrusive method.
@@ -70,20 +72,14 @@ my_campaign = uq.Campaign(name=campaign_name, work_dir=tmp_dir)
 # Create new directory for commons inputs
 campaign_dir = my_campaign.campaign_dir
 common_dir = campaign_dir +"/common/"
-os.system("mkdir " + common_dir)
+os.makedirs(common_dir, exist_ok=True)
 
 # Copy XML and XSD files
-os.system("cp " + xml_dir + "/ets.x* "    + common_dir)
-os.system("cp " + xml_dir + "/chease.x* " + common_dir)
-os.system("cp " + xml_dir + "/gem0.x* "   + common_dir)
-os.system("cp " + xml_dir + "/source_dummy.x* " + common_dir)
+copy_files(xml_dir, ["ets.x*", "chease.x*", "gem0.x*", "source_dummy.x*"], common_dir)
 
 # Copy input CPO files in common directory
-os.system("cp " + cpo_dir + "/ets_coreprof_in.cpo "    + common_dir)
-os.system("cp " + cpo_dir + "/ets_equilibrium_in.cpo " + common_dir)
-os.system("cp " + cpo_dir + "/ets_coreimpur_in.cpo "   + common_dir)
-os.system("cp " + cpo_dir + "/ets_coretransp_in.cpo "  + common_dir)
-os.system("cp " + cpo_dir + "/ets_toroidfield_in.cpo " + common_dir)
+copy_files(cpo_dir, ["ets_coreprof_in.cpo", "ets_equilibrium_in.cpo", "ets_coreimpur_in.cpo",
+                     "ets_coretransp_in.cpo", "ets_toroidfield_in.cpo"], common_dir)
 
 # Create the encoders and get the app parameters
 input_cpo_filename = "ets_coreprof_in.cpo"
@@ -139,7 +135,13 @@ my_campaign.populate_runs_dir()
 exec_path = os.path.join(obj_dir, exec_code)
 my_campaign.apply_for_each_run_dir(uq.actions.ExecuteLocal(exec_path))
 
-# Collate outputs
+# Decode the outputs of all runs in parallel, in a pool of processes. The profiles are
+# stored as arrays of shape (n_runs, n_rho) in campaign_dir/profiles, which can be
+# reloaded with utils.profile_store.ProfileStore, and handed to the decoder in memory
+profiles_dir = os.path.join(campaign_dir, "profiles")
+run_ids, profiles, complete = collate_profiles(decoder, my_campaign.list_runs(), store_dir=profiles_dir)
+
+# Collate outputs, with the profiles decoded above
 my_campaign.collate()
 
 # Post-processing analysis
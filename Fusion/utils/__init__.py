@@ -1,2 +1,6 @@
 from .cpo_tools    import *
 from .statistics import *
+from .cpo_patch import *
+from .staging import *
+from .collation import *
+from .profile_store import *
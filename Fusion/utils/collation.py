@@ -0,0 +1,82 @@
+# -*- coding: UTF-8 -*-
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from .profile_store import ProfileStore, create_profile_store
+
+
+# Collation of the QoI profiles of many runs in a pool of processes. Every worker decodes
+# a chunk of runs and returns one array per QoI, which are written into preallocated
+# arrays with one row per run.
+
+# Decode a chunk of runs, executed in a worker process.
+# Returns dict {qoi: array of shape (len(run_infos), n_rho)}
+def _decode_chunk(decoder, run_infos):
+    values = [decoder.get_qoi_values(run_info) for run_info in run_infos]
+    return {qoi: np.array([v[qoi] for v in values]) for qoi in decoder.output_columns}
+
+
+# Decode the outputs of runs, a list of (run_id, run_info) as returned by
+# campaign.list_runs(), with decoder (e.g. CPODecoder) in a pool of max_workers
+# processes, in chunks of chunk_size runs.
+# Returns the list of run ids, dict {qoi: array of shape (n_runs, n_rho)} with one row
+# per run in the order of runs, and the boolean array complete, False for the runs
+# without output. Raises a RuntimeError if outputs are missing, unless allow_missing
+# is True, in which case their rows are NaN.
+# If store_dir is given, the rows are written to a profile store in store_dir as they
+# come in (with the rho grid of decoder.get_rho), and the ProfileStore is returned
+# instead of the dict. If cache is True, the decoded values are also handed to the
+# decoder (decoder.cache_qoi_values), such that campaign.collate() does not read the
+# output files again.
+def collate_profiles(decoder, runs, max_workers=None, chunk_size=None, store_dir=None,
+                     allow_missing=False, cache=True):
+    runs = list(runs)
+    run_ids = [run_id for run_id, _ in runs]
+    run_infos = [run_info for _, run_info in runs]
+
+    complete = np.array([decoder.sim_complete(run_info) for run_info in run_infos], dtype=bool)
+    rows = np.flatnonzero(complete)
+    missing = [run_ids[i] for i in np.flatnonzero(~complete)]
+
+    if len(rows) == 0:
+        raise RuntimeError("No outputs found for any of the %d runs" % len(runs))
+    if len(missing) > 0 and not allow_missing:
+        raise RuntimeError("No outputs found for runs %s" % ", ".join(str(run_id) for run_id in missing))
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+    if chunk_size is None:
+        # About four chunks per worker, to balance the load
+        chunk_size = max(1, len(rows) // (4*max_workers))
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+
+    arrays = None
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(_decode_chunk, [decoder]*len(chunks),
+                           [[run_infos[i] for i in chunk] for chunk in chunks])
+
+        for chunk, result in zip(chunks, results):
+            if arrays is None:
+                if store_dir is not None:
+                    rho = decoder.get_rho(run_infos[rows[0]])
+                    arrays = create_profile_store(store_dir, rho, run_ids, decoder.output_columns,
+                                                  complete=complete)
+                    for qoi in decoder.output_columns:
+                        arrays[qoi][:] = np.nan
+                else:
+                    arrays = {qoi: np.full((len(runs),) + result[qoi].shape[1:], np.nan)
+                              for qoi in decoder.output_columns}
+
+            for qoi in decoder.output_columns:
+                arrays[qoi][chunk] = result[qoi]
+
+    if cache:
+        for i in rows:
+            decoder.cache_qoi_values(run_infos[i], {qoi: arrays[qoi][i] for qoi in decoder.output_columns})
+
+    if store_dir is not None:
+        for qoi in decoder.output_columns:
+            arrays[qoi].flush()
+        return run_ids, ProfileStore(store_dir), complete
+
+    return run_ids, arrays, complete
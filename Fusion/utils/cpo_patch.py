@@ -0,0 +1,143 @@
+# -*- coding: UTF-8 -*-
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+from ascii_cpo import write
+from .cpo_tools import copy_profiles
+
+
+# Writes CPO files that differ from a template only in a few values ("slots"). The
+# template is serialized once with ascii_cpo.write, with every slot set to a unique
+# sentinel value. The sentinels are located in the text, such that the file of a run
+# is produced by splicing the formatted values of its slots into the cached text,
+# without serializing the CPO object again.
+
+# Sentinel of the k-th slot: (k+1)*SENTINEL, recognizable at any output precision,
+# and with a two digit exponent
+SENTINEL = 1.0e90
+
+_FLOAT_TOKEN = re.compile(r"([-+]?)(\d*)\.(\d*)(?:([EeDd])([-+]?\d+))?")
+
+
+# Get a function formatting a value like the number token, e.g. 1.00000000000000000E+90
+# (scientific), 0.10000000000000000E+91 (Fortran E) or 1.000000 (fixed)
+def get_formatter(token):
+    m = _FLOAT_TOKEN.fullmatch(token)
+    if m is None:
+        return lambda v: repr(float(v))
+
+    lead, frac, exp_char = m.group(2), m.group(3), m.group(4)
+    prec = len(frac)
+
+    if exp_char is None:
+        return lambda v: "{:.{}f}".format(v, prec)
+
+    if lead in ("", "0"):
+        # Mantissa in [0.1, 1)
+        def formatter(v):
+            if v == 0.:
+                return "{}.{}{}+00".format(lead, "0"*prec, exp_char)
+            mantissa, exponent = "{:.{}E}".format(v, max(prec - 1, 0)).split("E")
+            sign = "-" if mantissa.startswith("-") else ""
+            digits = mantissa.lstrip("-").replace(".", "")
+            return "{}{}.{}{}{:+03d}".format(sign, lead, digits, exp_char, int(exponent) + 1)
+        return formatter
+
+    return lambda v: "{:.{}E}".format(v, prec).replace("E", exp_char)
+
+
+# Get the (path, index) slots in which cpo_copy differs from cpo_core, for the arrays
+# given by paths (e.g. "te.value")
+def get_changed_slots(cpo_core, cpo_copy, paths):
+    slots = []
+    for path in paths:
+        orig = get_array(cpo_core, path)
+        new = get_array(cpo_copy, path)
+        for index in zip(*np.nonzero(np.not_equal(orig, new))):
+            slots.append((path, tuple(int(i) for i in index)))
+    return slots
+
+
+def get_array(cpo_core, path):
+    node = cpo_core
+    for attr in path.split("."):
+        node = getattr(node, attr)
+    return node
+
+
+class CPOPatchWriter:
+
+    def __init__(self, cpo_core, slots):
+
+        self.slots = list(slots)
+        self.paths = sorted(set(path for path, _ in self.slots))
+
+        # Serialize the template once, with the sentinels in the slots
+        cpo_sentinel = copy_profiles(cpo_core, self.paths)
+        for k, (path, index) in enumerate(self.slots):
+            get_array(cpo_sentinel, path)[index] = (k + 1)*SENTINEL
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            tmp_file = os.path.join(tmp_dir, "template.cpo")
+            write(cpo_sentinel, tmp_file)
+            with open(tmp_file, "r") as f:
+                text = f.read()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        # Locate the sentinels in the text
+        spans = {}
+        for m in re.finditer(r"\S+", text):
+            try:
+                value = float(m.group().replace("D", "E").replace("d", "e"))
+            except ValueError:
+                continue
+            if not 0.5*SENTINEL < value < (len(self.slots) + 0.5)*SENTINEL:
+                continue
+            k = int(round(value/SENTINEL)) - 1
+            if abs(value - (k + 1)*SENTINEL) > 1e-6*value or k in spans:
+                raise RuntimeError("CPOPatchWriter: cannot locate the values of the CPO template.")
+            spans[k] = (m.start(), m.end())
+
+        if len(spans) != len(self.slots):
+            raise RuntimeError("CPOPatchWriter: found %d of %d values in the CPO template."
+                               % (len(spans), len(self.slots)))
+
+        # The text between the slots, and the format and field of every slot
+        self.segments = []
+        self.formatters = []
+        self.widths = []
+        self.order = sorted(spans, key=lambda k: spans[k][0])
+        pos = 0
+        for k in self.order:
+            start, end = spans[k]
+            # Include the preceding blanks in the field of the slot, such that longer
+            # values (e.g. negative) keep the column layout
+            field_start = start
+            while field_start > pos and text[field_start - 1] == " ":
+                field_start -= 1
+            self.segments.append(text[pos:field_start])
+            self.formatters.append(get_formatter(text[start:end]))
+            self.widths.append(end - field_start)
+            pos = end
+        self.segments.append(text[pos:])
+
+    # Write the CPO file of cpo_core, which must equal the template outside the slots
+    def write(self, cpo_core, filename):
+        arrays = {path: get_array(cpo_core, path) for path in self.paths}
+        values = [arrays[path][index] for path, index in self.slots]
+        self.write_values(values, filename)
+
+    # Write the CPO file of the template with values in the slots
+    def write_values(self, values, filename):
+        chunks = []
+        for segment, k, formatter, width in zip(self.segments, self.order, self.formatters, self.widths):
+            chunks.append(segment)
+            chunks.append(formatter(values[k]).rjust(width))
+        chunks.append(self.segments[-1])
+
+        with open(filename, "w") as f:
+            f.write("".join(chunks))
@@ -1,8 +1,14 @@
 import sys
+import copy
 import numpy as np
 from ascii_cpo import read
 
 
+# The arrays of a coreprof CPO that are modified by the encoders
+PROFILE_PATHS = ("te.value", "te.ddrho", "te.boundary.value",
+                 "ti.value", "ti.ddrho", "ti.boundary.value")
+
+
 # Get a list of indices in rho_tor_norm (in coreprof) that correspond
 # to the closest rho_thor_norm of flux tubes (in coretransp).
 #   corprof cpo file in one of gem0 input
@@ -49,3 +55,67 @@ def update_ti_grad(cpo_core, v, flux_index):
     cpo_core.ti.value[flux_index+1][0] = v * cpo_core.rho_tor[flux_index+1] + b
     cpo_core.ti.value[flux_index+2][0] = v * cpo_core.rho_tor[flux_index+2] + b
 
+# Structural copy of a CPO object: the arrays given by paths (e.g. "te.boundary.value")
+# are copied, together with the objects on their path (shallow), all other data is shared
+# with cpo_core. The copy can be modified and written without changing cpo_core.
+def copy_profiles(cpo_core, paths=PROFILE_PATHS):
+    cpo_copy = copy.copy(cpo_core)
+    for path in paths:
+        attrs = path.split(".")
+        orig = cpo_core
+        node = cpo_copy
+        for attr in attrs[:-1]:
+            orig = getattr(orig, attr)
+            child = getattr(node, attr)
+            # Objects shared by several paths are copied only once
+            if child is orig:
+                child = copy.copy(orig)
+                setattr(node, attr, child)
+            node = child
+        setattr(node, attrs[-1], np.copy(getattr(node, attrs[-1])))
+    return cpo_copy
+
+# Read only the given fields (e.g. ["te%value"]) of the ASCII CPO file, as a dict of
+# numpy arrays. The file is scanned once, up to the last of the fields. A field is a
+# line with its path (optionally starting with cpo_name), a line with its rank, a line
+# with its shape (if rank > 0) and its values in Fortran order. Raises ValueError if a
+# field is missing or does not have this layout.
+def read_fields(filename, cpo_name, fields):
+    names = {}
+    for field in fields:
+        names[field] = field
+        names[cpo_name + "%" + field] = field
+
+    values = {}
+    with open(filename, "r") as f:
+        lines = iter(f)
+        for line in lines:
+            field = names.get(line.strip())
+            if field is None or field in values:
+                continue
+
+            rank = int(next(lines))
+            shape = tuple(int(n) for n in next(lines).split()) if rank > 0 else ()
+            if len(shape) != rank:
+                raise ValueError("Bad shape of %s in %s" % (field, filename))
+
+            size = int(np.prod(shape))
+            tokens = []
+            while len(tokens) < max(size, 1):
+                tokens += next(lines).replace("D", "E").replace("d", "e").split()
+            if len(tokens) != max(size, 1):
+                raise ValueError("Bad number of values of %s in %s" % (field, filename))
+
+            data = np.array(tokens, dtype=float)
+            values[field] = data.reshape(shape, order="F") if rank > 0 else data[0]
+
+            # Stop as soon as all fields are read
+            if len(values) == len(fields):
+                break
+
+    missing = [field for field in fields if field not in values]
+    if missing:
+        raise ValueError("Fields %s not found in %s" % (missing, filename))
+
+    return values
+
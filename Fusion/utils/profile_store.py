@@ -0,0 +1,72 @@
+# -*- coding: UTF-8 -*-
+import os
+import json
+import numpy as np
+
+
+# Storage of the profile QoIs of a campaign, as one 2D array (n_runs x n_rho) per QoI.
+# A store is a directory with:
+#   - <qoi>.npy: the profiles of the QoI, one row per run, memory-mapped when read,
+#   - rho_tor_norm.npy: the radial grid, stored once,
+#   - runs.json: the run ids (in the order of the rows), the QoI names, and which runs
+#     are complete (the rows of runs without output are NaN).
+# Consumers (e.g. a PCE fit) read the QoIs as arrays, without a DataFrame per run.
+
+RHO_FILENAME = "rho_tor_norm.npy"
+RUNS_FILENAME = "runs.json"
+
+
+class ProfileStore:
+
+    def __init__(self, store_dir):
+
+        if not os.path.isfile(os.path.join(store_dir, RUNS_FILENAME)):
+            raise RuntimeError(f"No profile store in {store_dir}")
+
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, RUNS_FILENAME), "r") as f:
+            info = json.load(f)
+        self.run_ids = info["run_ids"]
+        self.qoi_cols = info["qoi_cols"]
+        self.complete = np.array(info.get("complete", [True]*len(self.run_ids)), dtype=bool)
+
+    # The radial grid
+    @property
+    def rho(self):
+        return np.load(os.path.join(self.store_dir, RHO_FILENAME))
+
+    # The (memory-mapped) profiles of qoi, shape (n_runs, n_rho)
+    def __getitem__(self, qoi):
+        if qoi not in self.qoi_cols:
+            raise KeyError(qoi)
+        return np.load(os.path.join(self.store_dir, qoi + ".npy"), mmap_mode="r")
+
+    def __contains__(self, qoi):
+        return qoi in self.qoi_cols
+
+    def keys(self):
+        return list(self.qoi_cols)
+
+    def items(self):
+        return [(qoi, self[qoi]) for qoi in self.qoi_cols]
+
+
+# Create an empty store for the profiles of n_runs runs on the grid rho. Returns dict
+# {qoi: writable memory-mapped array of shape (n_runs, len(rho))}, to be filled row by row.
+# complete marks the runs with output, by default all runs.
+def create_profile_store(store_dir, rho, run_ids, qoi_cols, dtype=np.float64, complete=None):
+    os.makedirs(store_dir, exist_ok=True)
+
+    np.save(os.path.join(store_dir, RHO_FILENAME), np.asarray(rho, dtype=np.float64))
+    profiles = {qoi: np.lib.format.open_memmap(os.path.join(store_dir, qoi + ".npy"), mode="w+",
+                                               dtype=dtype, shape=(len(run_ids), len(rho)))
+                for qoi in qoi_cols}
+
+    with open(os.path.join(store_dir, RUNS_FILENAME), "w") as f:
+        if complete is None:
+            complete = [True]*len(run_ids)
+        json.dump({"run_ids": list(run_ids), "qoi_cols": list(qoi_cols),
+                   "complete": [bool(c) for c in complete]}, f)
+
+    return profiles
+
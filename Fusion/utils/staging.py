@@ -0,0 +1,54 @@
+# -*- coding: UTF-8 -*-
+import os
+import fnmatch
+import shutil
+
+
+# Staging of the common input files (CPO, XML, XSD) in the run directories, with
+# file-system calls only (no shell). The listing of a common directory is done once
+# and cached, until the directory is modified.
+
+# Cached listings: directory -> (modification time, sorted file names)
+_listings = {}
+
+
+# Get the sorted names of the files in directory matching one of the patterns (e.g. "*.cpo")
+def list_files(directory, patterns):
+    directory = os.path.abspath(directory)
+    mtime = os.stat(directory).st_mtime_ns
+
+    listing = _listings.get(directory)
+    if listing is None or listing[0] != mtime:
+        names = sorted(entry.name for entry in os.scandir(directory) if entry.is_file())
+        listing = (mtime, names)
+        _listings[directory] = listing
+
+    return [name for name in listing[1]
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+
+
+# Link the files of common_dir matching patterns into target_dir, except the names in
+# exclude (e.g. the input file written by the encoder). Symbolic links by default, hard
+# links if hardlink is True. Existing files in target_dir are kept, as with 'ln -s'.
+def link_files(common_dir, target_dir, patterns, exclude=(), hardlink=False):
+    link = os.link if hardlink else os.symlink
+    for name in list_files(common_dir, patterns):
+        if name in exclude:
+            continue
+        try:
+            link(os.path.join(os.path.abspath(common_dir), name), os.path.join(target_dir, name))
+        except FileExistsError:
+            pass
+
+
+# Copy the files of src_dir matching patterns into dst_dir
+def copy_files(src_dir, patterns, dst_dir):
+    os.makedirs(dst_dir, exist_ok=True)
+    for name in list_files(src_dir, patterns):
+        shutil.copy2(os.path.join(src_dir, name), os.path.join(dst_dir, name))
+
+
+# Remove the file (or link) path if it exists, such that it is not written through a link
+def remove_file(path):
+    if os.path.lexists(path):
+        os.remove(path)